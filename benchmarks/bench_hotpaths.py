@@ -0,0 +1,211 @@
+"""Headless timings of the map and forecast hot paths on synthetic data.
+
+    python benchmarks/bench_hotpaths.py
+    python benchmarks/bench_hotpaths.py --reaches 1000 100000 --records 100000
+    python benchmarks/bench_hotpaths.py --compare benchmarks/results/before.json
+
+Synthetic StreamMidpoints databases are generated once per size in --workdir
+and reused by later runs. Every case is timed (best of --repeat) and run once
+more under tracemalloc for its peak Python/NumPy allocation; SQLite's own
+page cache is not included. Results are written as JSON so runs before and
+after a change can be compared with --compare.
+"""
+import argparse
+import json
+import os
+import platform
+import sqlite3
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from bench_parse import synthetic_values  # noqa: E402
+from clustering import ClusterIndex  # noqa: E402
+from decimate import lttb  # noqa: E402
+from point_store import PointStore  # noqa: E402
+from spatial_index import GridIndex  # noqa: E402
+from streamdb import StreamDB  # noqa: E402
+from waterml_parse import parse_values  # noqa: E402
+
+BOUNDS = (25.0, -124.0, 49.0, -67.0)  # CONUS, min_lat, min_lon, max_lat, max_lon
+VIEWPORT = (40.0, -111.9, 40.5, -111.4)  # about one screen at zoom 11
+MAX_STATIONS = 50000  # same limit as map3.query_viewport
+LOOKUPS = 20  # single-station lookups timed per case
+PLOT_POINTS = 700
+
+
+def make_db(path, n, seed=0):
+    # Same table the app reads; station IDs are unique but not in row order
+    rng = np.random.default_rng(seed)
+    ids = rng.permutation(np.arange(n, dtype=np.int64) * 13 + 1000)
+    lats = rng.uniform(BOUNDS[0], BOUNDS[2], n)
+    lons = rng.uniform(BOUNDS[1], BOUNDS[3], n)
+    # Put a share of the reaches in the benchmark viewport so queries return something
+    dense = n // 10
+    lats[:dense] = rng.uniform(VIEWPORT[0] - 1, VIEWPORT[2] + 1, dense)
+    lons[:dense] = rng.uniform(VIEWPORT[1] - 1, VIEWPORT[3] + 1, dense)
+
+    partial = path + ".part"
+    if os.path.exists(partial):
+        os.remove(partial)
+    conn = sqlite3.connect(partial)
+    conn.execute("CREATE TABLE StreamMidpoints (station_id INTEGER, lat REAL, lon REAL)")
+    conn.executemany("INSERT INTO StreamMidpoints VALUES (?, ?, ?)", zip(ids.tolist(), lats.tolist(), lons.tolist()))
+    conn.commit()
+    conn.close()
+    os.replace(partial, path)
+
+
+def legacy_bbox_filter(latitudes, longitudes, bbox):
+    # The loop map.py/map4.py run in create_markers, without creating widgets
+    min_lat, min_lon, max_lat, max_lon = bbox
+    return [
+        (lat, lon) for lat, lon in zip(latitudes, longitudes)
+        if min_lat - 0.5 <= lat <= max_lat + 0.5 and min_lon - 0.5 <= lon <= max_lon + 0.5
+    ]
+
+
+def draw_series(x, y, markers=False):
+    # What display_plot renders, on an off-screen Agg canvas
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+
+    figure = Figure(figsize=(7, 6))
+    FigureCanvasAgg(figure)
+    axes = figure.add_subplot()
+    axes.plot(x, y, marker='o' if markers else None)
+    axes.grid(True)
+    figure.canvas.draw()
+
+
+def measure(fn, repeat):
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - started)
+    return min(timings), peak
+
+
+def map_cases(db, store, sample):
+    lats, lons = db.lat_lon()
+    index = GridIndex(store.station_ids, store.lats, store.lons)
+    clusters = ClusterIndex(store)
+    ids, points = sample
+    return {
+        "db.lat_lon": db.lat_lon,
+        "PointStore.from_db": lambda: PointStore.from_db(db),
+        "legacy bbox filter": lambda: legacy_bbox_filter(lats, lons, VIEWPORT),
+        "GridIndex build": lambda: GridIndex(store.station_ids, store.lats, store.lons),
+        "GridIndex.query_bbox": lambda: index.query_bbox(*VIEWPORT, limit=MAX_STATIONS),
+        "ClusterIndex build": lambda: ClusterIndex(store),
+        "ClusterIndex.get_clusters z8": lambda: clusters.get_clusters(*BOUNDS, 8),
+        f"db.station_at x{LOOKUPS}": lambda: [db.station_at(lat, lon) for lat, lon in points],
+        f"PointStore.lookup x{LOOKUPS}": lambda: [store.lookup(station_id) for station_id in ids],
+    }
+
+
+def forecast_cases(values):
+    times, data = parse_values(values)
+    x = times.astype("datetime64[ms]").astype(np.int64) / 86_400_000.0
+    # The legacy display_plot always drew markers; HydrographPlot only while every point is drawn
+    markers = len(x) <= PLOT_POINTS
+    draw_series(x[:10], data[:10])  # font and backend setup is not part of any case
+    return {
+        "parse_values": lambda: parse_values(values),
+        "plot full series": lambda: draw_series(x, data, markers=True),
+        f"plot lttb {PLOT_POINTS}": lambda: draw_series(*lttb(x, data, PLOT_POINTS), markers),
+    }
+
+
+def run(args):
+    os.makedirs(args.workdir, exist_ok=True)
+    results = []
+
+    def record(group, n, cases):
+        for name, fn in cases.items():
+            seconds, peak = measure(fn, args.repeat)
+            results.append({"group": group, "case": name, "n": n, "seconds": seconds, "peak_bytes": peak})
+            print(f"{group:>9} {n:>9} {name:<32} {seconds * 1000:>10.2f} ms {peak / 1e6:>9.1f} MB")
+
+    for n in args.reaches:
+        path = os.path.join(args.workdir, f"streams_{n}.db")
+        if not os.path.exists(path):
+            make_db(path, n)
+        db = StreamDB(path)
+        store = PointStore.from_db(db)
+        rng = np.random.default_rng(1)
+        ids = store.station_ids[rng.integers(0, n, LOOKUPS)].tolist()
+        # The legacy lookup matches coordinates exactly as stored in the database
+        points = [
+            db.connection().execute("SELECT lat, lon FROM StreamMidpoints WHERE station_id = ?", (station_id,)).fetchone()
+            for station_id in ids
+        ]
+        record("map", n, map_cases(db, store, (ids, points)))
+        db.close()
+
+    for n in args.records:
+        record("forecast", n, forecast_cases(synthetic_values(n)))
+
+    return results
+
+
+def compare(results, baseline_path):
+    with open(baseline_path) as f:
+        baseline = {(r["group"], r["case"], r["n"]): r for r in json.load(f)["results"]}
+    print(f"\nCompared with {baseline_path} (time ratio, >1 is faster now)")
+    for r in results:
+        before = baseline.get((r["group"], r["case"], r["n"]))
+        if before is not None:
+            print(f"{r['group']:>9} {r['n']:>9} {r['case']:<32} {before['seconds'] / r['seconds']:>7.2f}x")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--reaches", nargs="+", type=int, default=[1_000, 10_000, 100_000, 1_000_000])
+    parser.add_argument("--records", nargs="+", type=int, default=[1_000, 100_000, 1_000_000])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--workdir", default=os.path.join(tempfile.gettempdir(), "nwm_bench"),
+                        help="where synthetic databases are generated and kept")
+    parser.add_argument("--output", help="results JSON; defaults to benchmarks/results/hotpaths-<time>.json")
+    parser.add_argument("--compare", help="earlier results JSON to compare against")
+    args = parser.parse_args(argv)
+
+    results = run(args)
+
+    output = args.output or os.path.join(
+        os.path.dirname(os.path.abspath(__file__)), "results", time.strftime("hotpaths-%Y%m%d-%H%M%S.json")
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(
+            {
+                "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "python": platform.python_version(),
+                "numpy": np.__version__,
+                "platform": platform.platform(),
+                "repeat": args.repeat,
+                "results": results,
+            },
+            f,
+            indent=1,
+        )
+    print(f"Results written to {output}")
+
+    if args.compare:
+        compare(results, args.compare)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,64 @@
+"""Compare WaterML value parsing: per-record strptime vs. waterml_parse.
+
+    python benchmarks/bench_parse.py
+    python benchmarks/bench_parse.py --sizes 100000 1000000
+"""
+import argparse
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from waterml_parse import parse_values  # noqa: E402
+
+
+def synthetic_values(n, step_minutes=15):
+    # Records shaped like pywaterml's GetValues()["values"]
+    start = datetime(2005, 12, 4)
+    return [
+        {
+            "dateTime": (start + timedelta(minutes=step_minutes * i)).strftime("%Y-%m-%d %H:%M:%S"),
+            "timeOffset": "-05:00",
+            "dataValue": "-9999" if i % 997 == 0 else f"{(i % 400) / 10:.1f}",
+        }
+        for i in range(n)
+    ]
+
+
+def strptime_parse(values):
+    # What the app did before: one datetime and one untyped value per record
+    datetimes = [datetime.strptime(d['dateTime'], '%Y-%m-%d %H:%M:%S') for d in values]
+    data = [d['dataValue'] for d in values]
+    return datetimes, data
+
+
+def best_of(fn, values, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn(values)
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", nargs="+", type=int, default=[100_000, 1_000_000])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args(argv)
+
+    print(f"{'records':>10} {'strptime s':>12} {'numpy s':>10} {'speedup':>8}")
+    results = []
+    for n in args.sizes:
+        values = synthetic_values(n)
+        baseline = best_of(strptime_parse, values, args.repeat)
+        vectorized = best_of(parse_values, values, args.repeat)
+        results.append({"records": n, "strptime": baseline, "numpy": vectorized, "speedup": baseline / vectorized})
+        print(f"{n:>10} {baseline:>12.3f} {vectorized:>10.3f} {baseline / vectorized:>7.1f}x")
+    return results
+
+
+if __name__ == "__main__":
+    main()
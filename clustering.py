@@ -0,0 +1,97 @@
+from collections import namedtuple
+
+import numpy as np
+
+from spatial_index import GridIndex
+
+Cluster = namedtuple("Cluster", ["cluster_id", "lat", "lon", "count", "station_id"])
+
+
+def lon_to_x(lon):
+    return np.asarray(lon, dtype=np.float64) / 360.0 + 0.5
+
+
+def lat_to_y(lat):
+    sin = np.sin(np.radians(np.asarray(lat, dtype=np.float64)))
+    sin = np.clip(sin, -0.9999, 0.9999)
+    y = 0.5 - 0.25 * np.log((1 + sin) / (1 - sin)) / np.pi
+    return np.clip(y, 0.0, 1.0)
+
+
+def x_to_lon(x):
+    return (x - 0.5) * 360.0
+
+
+def y_to_lat(y):
+    return np.degrees(np.arctan(np.sinh(np.pi * (1 - 2 * y))))
+
+
+class ClusterIndex:
+    # Supercluster-style hierarchy: every zoom level from max_zoom down to
+    # min_zoom is built by merging the clusters of the level below it on a
+    # grid whose cells are `radius` screen pixels wide at that zoom.
+    #
+    # With per-point ranks and min_rank_for_zoom(zoom), each zoom level only
+    # clusters the points ranked at least that minimum. Zoom levels sharing a
+    # minimum rank form one hierarchy, started afresh from the filtered
+    # points wherever the minimum changes.
+    def __init__(self, store, min_zoom=0, max_zoom=11, radius=60, tile_size=256, ranks=None, min_rank_for_zoom=None):
+        self.min_zoom = min_zoom
+        self.max_zoom = max_zoom
+        self.radius = radius
+        self.tile_size = tile_size
+        self.store = store
+        self.levels = {}
+
+        # Working arrays in normalized mercator units. `point` is the store
+        # position of a single-point cluster and -1 for merged clusters.
+        band = None
+        for zoom in range(max_zoom, min_zoom - 1, -1):
+            min_rank = min_rank_for_zoom(zoom) if ranks is not None else None
+            if zoom == max_zoom or min_rank != band:
+                band = min_rank
+                point = np.arange(len(store), dtype=np.int64)
+                if min_rank is not None:
+                    point = np.flatnonzero(np.asarray(ranks) >= min_rank)
+                x = lon_to_x(store.lons[point])
+                y = lat_to_y(store.lats[point])
+                count = np.ones(len(point), dtype=np.int64)
+            x, y, count, point = self._merge(x, y, count, point, zoom)
+
+            # Single-point clusters sit exactly on their station
+            single = point >= 0
+            lats = np.where(single, store.lats[np.maximum(point, 0)], y_to_lat(y))
+            lons = np.where(single, store.lons[np.maximum(point, 0)], x_to_lon(x))
+            ids = np.arange(len(x), dtype=np.int64)
+            index = GridIndex(ids, lats, lons, cell_size=self._cell_degrees(zoom))
+            self.levels[zoom] = (index, count[index.station_ids], point[index.station_ids])
+
+    def _cell_degrees(self, zoom):
+        # A few cluster cells per index cell keeps viewport queries cheap at every level
+        return max(360.0 / 2 ** zoom, 0.01)
+
+    def _merge(self, x, y, count, point, zoom):
+        cell = self.radius / (self.tile_size * 2 ** zoom)
+        columns = int(np.ceil(1 / cell)) + 1
+        keys = (x // cell).astype(np.int64) * columns + (y // cell).astype(np.int64)
+
+        _, first, group, sizes = np.unique(keys, return_index=True, return_inverse=True, return_counts=True)
+        total = np.bincount(group, weights=count)
+        merged_x = np.bincount(group, weights=x * count) / total
+        merged_y = np.bincount(group, weights=y * count) / total
+
+        # Only single-point clusters keep their point
+        merged_point = np.where(sizes == 1, point[first], -1)
+        return merged_x, merged_y, total.astype(np.int64), merged_point
+
+    def get_clusters(self, min_lat, min_lon, max_lat, max_lon, zoom):
+        zoom = min(max(int(zoom), self.min_zoom), self.max_zoom)
+        index, counts, points = self.levels[zoom]
+        clusters = []
+        for i in index.query_indices(min_lat, min_lon, max_lat, max_lon).tolist():
+            point = int(points[i])
+            station_id = int(self.store.station_ids[point]) if point >= 0 else None
+            clusters.append(
+                Cluster(f"{zoom}:{int(index.station_ids[i])}", float(index.lats[i]), float(index.lons[i]), int(counts[i]), station_id)
+            )
+        return clusters
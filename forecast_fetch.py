@@ -0,0 +1,182 @@
+import random
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+
+
+def clock_dispatch(callback):
+    # Run callback on the Kivy main thread
+    from kivy.clock import Clock
+    Clock.schedule_once(lambda dt: callback(), 0)
+
+
+class HostRateLimiter:
+    # Spaces out requests to the same host to at most `rate` per second
+    def __init__(self, rate=4.0):
+        self.interval = 1.0 / rate
+        self.next_slot = {}  # host -> earliest time the next request may start
+        self.lock = threading.Lock()
+
+    def wait(self, url):
+        host = urlparse(url).netloc
+        with self.lock:
+            now = time.monotonic()
+            slot = max(self.next_slot.get(host, now), now)
+            self.next_slot[host] = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+def with_retries(fn, args, retries=2, backoff=0.5, limiter=None):
+    for attempt in range(retries + 1):
+        if limiter is not None:
+            limiter.wait(args[0])
+        try:
+            return fn(*args)
+        except Exception:
+            if attempt == retries:
+                raise
+            time.sleep(backoff * 2 ** attempt * (1 + random.random()))
+
+
+class ForecastFetcher:
+    # Runs blocking forecast requests on worker threads and hands the results
+    # back through `dispatch`, which defaults to the Kivy clock. Requests are
+    # keyed so a speculative prefetch and the later real fetch share one call.
+    # A result is handed out once: the future is dropped as soon as a fetch
+    # has taken it, and a prefetched result nobody fetched is dropped after
+    # `result_ttl` seconds, so later requests always reach the caches below.
+    # Done callbacks run on worker threads, so `futures` is only touched
+    # under `lock`; it is reentrant because a callback added to a future that
+    # is already done runs right away, in the thread that added it.
+    def __init__(self, max_workers=8, dispatch=clock_dispatch, keep_results=8, rate=4.0, result_ttl=120):
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="forecast")
+        self.dispatch = dispatch
+        self.limiter = HostRateLimiter(rate)
+        self.keep_results = keep_results
+        self.result_ttl = result_ttl
+        self.futures = OrderedDict()  # key -> Future in flight or not yet fetched, most recently used last
+        self.lock = threading.RLock()
+        self.generation = 0
+
+    def prefetch(self, key, fn, *args):
+        with self.lock:
+            future = self.futures.get(key)
+            if future is None or future.cancelled() or (future.done() and future.exception() is not None):
+                future = self.executor.submit(fn, *args)
+                future.submitted = time.monotonic()
+                future.taken = False
+                self.futures[key] = future
+                future.add_done_callback(lambda future: self._forget(key, future))
+            self.futures.move_to_end(key)
+            self._trim()
+            return future
+
+    def take(self, key, fn, *args):
+        # Like prefetch, for a caller that consumes the result: the future is
+        # no longer shared once it is done
+        with self.lock:
+            future = self.prefetch(key, fn, *args)
+            future.taken = True
+            self._forget(key, future)
+            return future
+
+    def _forget(self, key, future):
+        with self.lock:
+            if future.done() and future.taken and self.futures.get(key) is future:
+                del self.futures[key]
+
+    def fetch(self, key, fn, *args, on_result, on_error=None):
+        generation = self.generation
+        future = self.take(key, fn, *args)
+
+        def deliver(future):
+            if future.cancelled():
+                return
+            error = future.exception()
+
+            def callback():
+                # Drop results for requests that were cancelled in the meantime
+                if generation != self.generation:
+                    return
+                if error is None:
+                    on_result(future.result())
+                elif on_error is not None:
+                    on_error(error)
+
+            self.dispatch(callback)
+
+        future.add_done_callback(deliver)
+        return future
+
+    def fetch_batch(self, fn, url, site_codes, variable_code, start_date, end_date, on_result,
+                    on_error=None, on_complete=None, max_concurrency=4, retries=2):
+        # Fans out one fn(url, site, variable, start, end) call per site with at
+        # most max_concurrency in flight, rate limited per host and retried with
+        # backoff. on_result(site, result) runs on the main thread as each one
+        # finishes; on_complete() runs once every site has been handled.
+        generation = self.generation
+        queue = list(site_codes)
+        state = {"running": 0, "left": len(queue)}
+        lock = threading.Lock()
+
+        def deliver(callback):
+            def run():
+                if generation == self.generation:
+                    callback()
+            self.dispatch(run)
+
+        def finished(site, future):
+            if not future.cancelled():
+                error = future.exception()
+                if error is None:
+                    deliver(lambda: on_result(site, future.result()))
+                elif on_error is not None:
+                    deliver(lambda: on_error(site, error))
+            with lock:
+                state["running"] -= 1
+                state["left"] -= 1
+                done = state["left"] == 0
+            if done and on_complete is not None:
+                deliver(on_complete)
+            submit_next()
+
+        def submit_next():
+            while True:
+                with lock:
+                    if not queue or state["running"] >= max_concurrency or generation != self.generation:
+                        return
+                    site = queue.pop(0)
+                    state["running"] += 1
+                args = (url, site, variable_code, start_date, end_date)
+                future = self.take(args, with_retries, fn, args, retries, 0.5, self.limiter)
+                future.add_done_callback(lambda future, site=site: finished(site, future))
+
+        if not queue and on_complete is not None:
+            deliver(on_complete)
+        submit_next()
+
+    def cancel(self):
+        # Invalidate outstanding callbacks and stop requests that have not started yet
+        with self.lock:
+            self.generation += 1
+            for key, future in list(self.futures.items()):
+                if not future.done():
+                    future.cancel()
+                    del self.futures[key]
+
+    def _trim(self):
+        # Called with the lock held; drops prefetched results that were never fetched
+        now = time.monotonic()
+        done = [key for key, future in self.futures.items() if future.done()]
+        expired = [key for key in done if now - self.futures[key].submitted > self.result_ttl]
+        for key in set(expired + done[:max(len(done) - self.keep_results, 0)]):
+            del self.futures[key]
+
+    def shutdown(self, wait=True):
+        # Requests already running are finished first when wait is set, so
+        # whatever they use can be closed safely afterwards
+        self.cancel()
+        self.executor.shutdown(wait=wait)
@@ -0,0 +1,82 @@
+import threading
+import time
+from contextlib import contextmanager
+
+from pywaterml import waterML
+
+import perf
+
+from waterml_parse import parse_values, utc_offset
+
+# Massachusetts Water Resources Authority (MWRA) HydroServer service
+MWRA_URL = "https://hydroportal.cuahsi.org/MWRA/cuahsi_1_1.asmx?WSDL"
+
+
+class ClientPool:
+    # Long-lived WaterMLOperations clients keyed by endpoint URL. Creating a
+    # client downloads and parses the WSDL, so each one is kept and reused.
+    # SOAP clients are not safe to share between threads; a worker borrows an
+    # idle client for the duration of a call and a new one is only built when
+    # every pooled client for that URL is busy.
+    def __init__(self, factory=waterML.WaterMLOperations, max_idle=4):
+        self.factory = factory
+        self.max_idle = max_idle
+        self.idle = {}  # url -> [WaterMLOperations]
+        self.lock = threading.Lock()
+
+    @contextmanager
+    def client(self, url):
+        with self.lock:
+            clients = self.idle.get(url)
+            water = clients.pop() if clients else None
+        if water is None:
+            water = self.factory(url)
+        try:
+            yield water
+        finally:
+            with self.lock:
+                clients = self.idle.setdefault(url, [])
+                if len(clients) < self.max_idle:
+                    clients.append(water)
+
+
+class SiteCatalog:
+    # GetSites returns the whole catalog of a service, which rarely changes.
+    # It is fetched on demand and refreshed once it is older than max_age.
+    def __init__(self, pool, max_age=24 * 3600):
+        self.pool = pool
+        self.max_age = max_age
+        self.catalogs = {}  # url -> (fetched_at, sites)
+        self.lock = threading.Lock()
+
+    def get_sites(self, url, refresh=False):
+        with self.lock:
+            cached = self.catalogs.get(url)
+        if cached and not refresh and time.time() - cached[0] < self.max_age:
+            return cached[1]
+
+        with self.pool.client(url) as water:
+            sites = water.GetSites()
+        with self.lock:
+            self.catalogs[url] = (time.time(), sites)
+        return sites
+
+
+pool = ClientPool()
+catalog = SiteCatalog(pool)
+
+
+def get_sites(url, refresh=False):
+    return catalog.get_sites(url, refresh=refresh)
+
+
+def get_values(url, site_full_code, variable_full_code, start_date, end_date):
+    # Site and variable codes are "full codes", e.g. "MWRA:36" and "MWRA:Temp"
+    with perf.timer("waterml.fetch"), pool.client(url) as water:
+        data = water.GetValues(site_full_code, variable_full_code, start_date, end_date)["values"]
+
+    # (datetime64[s] UTC timestamps, float64 values with NaN for no-data,
+    # minutes east of UTC of the service's dates or None when unknown)
+    with perf.timer("waterml.parse"):
+        times, values = parse_values(data)
+    return times, values, utc_offset(data)
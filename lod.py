@@ -0,0 +1,73 @@
+import os
+
+import numpy as np
+
+# Minimum order shown from each zoom level up to the next entry, applied to
+# station queries and to the cluster levels
+ZOOM_MIN_ORDER = [(0, 7), (6, 6), (8, 5), (10, 4), (12, 3), (13, 2), (14, 1)]
+
+MAX_ORDER = 8
+BASE_CELL = 0.01  # degrees; derived orders double the thinning cell per order
+
+
+def min_order_for_zoom(zoom):
+    order = ZOOM_MIN_ORDER[0][1]
+    for min_zoom, min_order in ZOOM_MIN_ORDER:
+        if zoom >= min_zoom:
+            order = min_order
+    return order
+
+
+def db_orders(db, store):
+    # Strahler order from the database, aligned to the store, when the column exists
+    columns = [row[1] for row in db.connection().execute("PRAGMA table_info(StreamMidpoints)")]
+    if "stream_order" not in columns:
+        return None
+    rows = np.fromiter(
+        db.connection().execute("SELECT station_id, COALESCE(stream_order, 1) FROM StreamMidpoints"),
+        dtype=[("station_id", np.int64), ("order", np.int64)],
+    )
+    orders = np.ones(len(store), dtype=np.int8)
+    positions = np.searchsorted(store.station_ids, rows["station_id"])
+    orders[positions] = np.clip(rows["order"], 1, MAX_ORDER)
+    return orders
+
+
+def derived_orders(store):
+    # Without a stream order column, rank reaches by spatial thinning: the
+    # reaches that survive as one-per-cell on ever coarser grids get higher
+    # orders, so every zoom keeps an evenly spread subset of the network.
+    # This says nothing about a reach's size or importance; the survivor of
+    # a cell is simply its lowest station ID.
+    orders = np.ones(len(store), dtype=np.int8)
+    survivors = np.arange(len(store))
+    lats = store.lats.astype(np.float64)
+    lons = store.lons.astype(np.float64)
+    for order in range(2, MAX_ORDER + 1):
+        cell = BASE_CELL * 2 ** (order - 2)
+        rows = np.floor(lats[survivors] / cell).astype(np.int64)
+        cols = np.floor(lons[survivors] / cell).astype(np.int64)
+        keys = rows * (int(360 / cell) + 2) + cols
+        _, first = np.unique(keys, return_index=True)
+        survivors = survivors[np.sort(first)]
+        orders[survivors] = order
+    return orders
+
+
+def load_orders(db, store, directory):
+    # Level-of-detail attribute per reach, cached next to the point store arrays
+    path = os.path.join(directory, "order.npy")
+    if os.path.exists(path) and os.path.getmtime(path) >= os.path.getmtime(db.path):
+        orders = np.load(path)
+        if len(orders) == len(store):
+            return orders
+
+    orders = db_orders(db, store)
+    if orders is None:
+        orders = derived_orders(store)
+    try:
+        os.makedirs(directory, exist_ok=True)
+        np.save(path, orders)
+    except OSError as error:
+        print(f"Could not write stream orders {path}: {error}")
+    return orders
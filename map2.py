@@ -1,67 +1,36 @@
-import sqlite3
-
 from kivymd.app import MDApp
-from kivy.lang import Builder
-from kivy.properties import ObjectProperty, StringProperty
 from kivy.core.window import Window
 from kivymd.uix.screenmanager import MDScreenManager
 from kivymd.uix.screen import MDScreen
-from kivy_garden.mapview import MapMarkerPopup, MapMarker, MapView, MarkerMapLayer
+from kivy_garden.mapview import MapMarker, MarkerMapLayer
 from kivy.clock import Clock
-from KivyMD.kivymd.uix.boxlayout import MDBoxLayout
-
-class MapScreen(MDScreen):
-    def get_lat_lon(self):
-        latitudes = []
-        longitudes = []
-        
-        # Connect to the database and retrieve latitudes and longitudes
-        conn = sqlite3.connect("originalsample.db")
-        cursor = conn.cursor()
-        cursor.execute("SELECT * FROM StreamMidpoints")
-        records = cursor.fetchall()
-
-        for record in records:
-            latitudes.append(record[1])
-            longitudes.append(record[2])
+import perf
+from streamdb import StreamDB
 
-        conn.close()
+db = StreamDB.from_env("originalsample.db")
 
-        return latitudes, longitudes
+class MapScreen(MDScreen):
+    def get_points(self):
+        return db.all_points()
     
-    def get_station_id(self, lat, lon):
-        # conn = sqlite3.connect("datasample.db")
-        conn = sqlite3.connect("originalsample.db")
-        cursor = conn.cursor()
-        cursor.execute("SELECT station_id FROM StreamMidpoints WHERE lat = ? AND lon = ?", (lat, lon))
-        result = cursor.fetchone()
-        conn.close()
-        
-        if result:
-            return result[0]  # Return the station_id value
-        else:
-            return None  # Return None if no matching record found
-        
     def on_marker_press(self, marker):
         lat = float(marker.lat)
         lon = float(marker.lon)
-        station_id = self.get_station_id(lat, lon)
+        station_id = marker.station_id
         if station_id:
             print(f"Station ID for marker at ({lat}, {lon}): {station_id}")
             self.ids.station_id.text = f"{station_id}"
         else:
             print(f"No station ID found for the marker at ({lat}, {lon}).")
 
+    @perf.timed("markers.create")
     def create_markers(self):
         # Get the bounding box coordinates
         bbox = self.ids.main_map.get_bbox()
         min_lat, min_lon, max_lat, max_lon = bbox
 
-        # Retrieve latitudes and longitudes
-        latitudes, longitudes = self.get_lat_lon()
-
-        # print(f'lat: {latitudes}, lon: {longitudes}')
-        print(f"This is the bounding box: {bbox}")
+        # Retrieve the station IDs and coordinates
+        points = self.get_points()
 
         # Calculate marker size based on the zoom level
         zoom = self.ids.main_map.zoom
@@ -77,10 +46,11 @@ class MapScreen(MDScreen):
             marker_map_layer = MarkerMapLayer()
             self.ids.main_map.add_layer(marker_map_layer)
 
-        # Iterate over the latitudes and longitudes and add markers inside the bounding box
-        for lat, lon in zip(latitudes, longitudes):
+        # Iterate over the stations and add markers inside the bounding box
+        for station_id, lat, lon in points:
             if min_lat-.5 <= lat <= max_lat+.5 and min_lon-.5 <= lon <= max_lon+.5:
                 new_marker = MapMarker(lat=str(lat), lon=str(lon), source = "icon2.png")
+                new_marker.station_id = station_id
                 new_marker.size = [marker_size for size in new_marker.texture_size]
                 new_marker.bind(on_press=self.on_marker_press)
                 marker_map_layer.add_widget(new_marker)
@@ -106,7 +76,7 @@ class MapScreen(MDScreen):
 #                         print(f'MapMarker: lat={marker.lat}, lon={marker.lon}')
 
 #         # Create and add new markers based on the lists of latitudes and longitudes
-#         for lat, lon in zip(latitudes, longitudes):
+#         for station_id, lat, lon in points:
 #             new_marker = MapMarker(lat=str(lat), lon=str(lon))
 #             self.ids.main_map.add_widget(new_marker)
     
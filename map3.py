@@ -1,161 +1,398 @@
-import sqlite3
+import time
+STARTED = time.perf_counter()  # Startup milestones are measured from here
 
+import importlib
+import os
 from kivymd.app import MDApp
-from kivy.lang import Builder
-from kivy.properties import ObjectProperty, StringProperty
+from kivy.properties import NumericProperty
 from kivy.core.window import Window
 from kivymd.uix.screenmanager import MDScreenManager
 from kivymd.uix.screen import MDScreen
-from kivy_garden.mapview import MapMarkerPopup, MapMarker, MapView, MarkerMapLayer
+from kivy_garden.mapview import MapMarker, MarkerMapLayer
 from kivy.clock import Clock
-from pywaterml import waterML
-from datetime import datetime
-import matplotlib.pyplot as plt
-from kivy.garden.matplotlib.backend_kivyagg import FigureCanvasKivyAgg # type: ignore
+from kivymd.uix.label import MDLabel
+from kivy.uix.label import Label
+from spatial_index import GridIndex
+from clustering import ClusterIndex
+from forecast_fetch import ForecastFetcher
+from timeseries_cache import TimeSeriesCache, cached_get_values
+from functools import partial
+from tile_cache import TileCacheIndex
+from tile_source import CachedMapSource
+from marker_manager import MarkerManager
+from station_layer import StationLayer
+from overlay_layer import OverlayTileLayer
+from viewport_scheduler import ViewportScheduler
+from streamdb import StreamDB
+from point_store import PointStore
+from lod import load_orders, min_order_for_zoom
+from nearest import NearestIndex, ground_resolution_km
+from nwm_source import NWMSource
+from reach_store import ReachStore, stored_get_streamflow
+from startup_timer import StartupTimer
+import perf
+
+# hydroserver (pywaterml and its SOAP client) and plot_canvas (matplotlib)
+# are imported on first use so they stay off the startup path
+startup = StartupTimer(STARTED)
+startup.mark("imports")
+
+MAX_STATIONS = 50000  # Upper bound on stations drawn by the batched station layer
+CLUSTER_MAX_ZOOM = 11  # Zoom levels at or below this show clusters instead of stations
+OVERLAY_MAX_ZOOM = 10  # Zoom levels at or below this show pre-rendered reach tiles when present
+TAP_RADIUS = 24  # pixels around a tap searched for the nearest reach
+TAP_SLOP = 10  # pixels a touch may move and still count as a tap
+
+TILE_CACHE_QUOTA = 32 * 1024 * 1024  # bytes of cached tiles kept per provider
+TILE_CACHE_MAX_AGE = 30 * 24 * 3600  # seconds before a cached tile is refreshed
+
+# Set NWM_PERF_OVERLAY=1 to show frame time, marker count and query latency
+# over the map, and NWM_PERF_TRACE to a path to keep a Chrome trace of the
+# most recent timed events there, rewritten every PERF_TRACE_INTERVAL seconds
+PERF_OVERLAY = os.environ.get("NWM_PERF_OVERLAY") == "1"
+PERF_TRACE_PATH = os.environ.get("NWM_PERF_TRACE")
+PERF_TRACE_INTERVAL = 30
+
+db = StreamDB.from_env("datasample.db")
+POINT_CACHE_DIR = "pointcache"  # .npy arrays generated from the database
+OVERLAY_DIR = "overlay"  # Reach tiles written by render_overlay.py
+OVERLAY_CACHE_KEY = "nwm-streams"
+
+# Forecast series shown on the ForecastScreen, one line per site
+FORECAST_URL = "https://hydroportal.cuahsi.org/MWRA/cuahsi_1_1.asmx?WSDL"  # hydroserver.MWRA_URL
+FORECAST_SITES = ["MWRA:36"]  # Site "full codes"; list several to compare them
+FORECAST_VARIABLE = "MWRA:Temp"
+FORECAST_START = "2005-12-04"
+FORECAST_END = "2006-07-06"
+FORECAST_CONCURRENCY = 4  # GetValues requests in flight at once
+
+# NWM channel_rt output, a local directory or an object-store URL such as
+# s3://noaa-nwm-pds. When set, the selected reach's streamflow is plotted
+# instead of the HydroServer series above.
+NWM_ROOT = os.environ.get("NWM_DATA_ROOT")
+NWM_CONFIGURATION = "short_range"  # short_range, medium_range or long_range
+NWM_STORE_DIR = "nwmstore"  # Reach-major cycles written by reach_store.py
+
+class ClusterMarker(MapMarker):
+    count = NumericProperty(0)
 
 class MapScreen(MDScreen):
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
         self.station_id = None
-        self.created_markers = set()  # Store coordinates of created markers
+        self.store = None  # Columnar StreamMidpoints arrays, loaded once
+        self.index = None  # Spatial index over StreamMidpoints, built on first use
+        self.clusters = None  # Per-zoom cluster hierarchy, built on first use
+        self.nearest = None  # KD-tree over StreamMidpoints for taps and k-nearest searches
+        self.station_layer = None  # Canvas layer drawing the visible stations in one batch
+        self.reach_tiles = None  # Pre-rendered reach tiles for overview zooms, when rendered
+        self.cluster_markers = None  # Visible cluster markers keyed by cluster_id
+        self.scheduler = ViewportScheduler(self.viewport_state, self.query_viewport, self.apply_viewport)
+        self.overlay = None  # Performance overlay label, only when enabled
 
     def on_zoom(self, instance, zoom):
         # Handle changes in zoom level by updating markers
-        self.update_markers()
+        self.scheduler.request()
 
-    def get_lat_lon(self):
-        latitudes = []
-        longitudes = []
-        
-        # Connect to the database and retrieve latitudes and longitudes
-        conn = sqlite3.connect("datasample.db")
-        # conn = sqlite3.connect("originalsample.db")
-        cursor = conn.cursor()
-        cursor.execute("SELECT * FROM StreamMidpoints")
-        records = cursor.fetchall()
-
-        for record in records:
-            latitudes.append(record[1])
-            longitudes.append(record[2])
+    def get_store(self):
+        # Keep every reach midpoint in memory so marker presses never hit the database
+        if self.store is None:
+            self.store = PointStore.from_cache(db, POINT_CACHE_DIR)
+        return self.store
 
-        conn.close()
+    def get_index(self):
+        # Build the spatial index once instead of re-reading the table on every update
+        if self.index is None:
+            store = self.get_store()
+            orders = load_orders(db, store, POINT_CACHE_DIR)
+            self.index = GridIndex(store.station_ids, store.lats, store.lons, ranks=orders)
+        return self.index
 
-        return latitudes, longitudes
+    def get_clusters(self):
+        if self.clusters is None:
+            store = self.get_store()
+            orders = load_orders(db, store, POINT_CACHE_DIR)
+            self.clusters = ClusterIndex(store, max_zoom=CLUSTER_MAX_ZOOM, ranks=orders, min_rank_for_zoom=min_order_for_zoom)
+        return self.clusters
     
-    def get_station_id(self, lat, lon):
-        conn = sqlite3.connect("datasample.db")
-        # conn = sqlite3.connect("originalsample.db")
-        cursor = conn.cursor()
-        cursor.execute("SELECT station_id FROM StreamMidpoints WHERE lat = ? AND lon = ?", (lat, lon))
-        result = cursor.fetchone()
-        conn.close()
-        
-        if result:
-            return result[0]  # Return the station_id value
-        else:
-            return None  # Return None if no matching record found
+    def get_nearest(self):
+        if self.nearest is None:
+            self.nearest = NearestIndex.from_store(self.get_store())
+        return self.nearest
+
+    def prefetch_nearest(self):
+        # Builds the KD-tree on a worker thread; an unfinished build is shared, a failed one restarted
+        return MDApp.get_running_app().fetcher.prefetch(("nearest",), self.get_nearest)
+
+    def nearest_stations(self, lat, lon, k=5, max_km=None):
+        # [(station_id, distance_km)], nearest first; needs no markers on screen
+        return self.get_nearest().nearest(lat, lon, k=k, max_km=max_km)
+
+    def on_map_touch_up(self, mapview, touch):
+        # A tap that did not hit a marker selects the nearest reach within TAP_RADIUS pixels
+        if "station_id" in touch.ud or touch.is_double_tap or touch.is_mouse_scrolling:
+            return False
+        if not mapview.collide_point(*touch.pos) or touch.grab_current is not None:
+            return False
+        if abs(touch.x - touch.ox) > TAP_SLOP or abs(touch.y - touch.oy) > TAP_SLOP:
+            return False
+        if self.cluster_markers and any(marker.collide_point(*touch.pos) for marker in self.cluster_markers.visible.values()):
+            return False
+        if self.nearest is None:
+            # Building the index here would freeze the UI and race the background build
+            self.prefetch_nearest()
+            return False
+
+        lat, lon = mapview.get_latlon_at(touch.x - mapview.x, touch.y - mapview.y)
+        km_per_pixel = ground_resolution_km(lat, mapview.zoom, mapview.map_source.dp_tile_size, mapview.scale)
+        found = self.nearest_stations(lat, lon, k=1, max_km=TAP_RADIUS * km_per_pixel)
+        if not found:
+            return False
+        self.select_station(found[0][0])
+        return True
+
+    def get_station(self, station_id):
+        # Returns (lat, lon) for a station, or None if it is unknown
+        return self.get_store().lookup(station_id)
         
     def on_marker_press(self, marker):
-        lat = float(marker.lat)
-        lon = float(marker.lon)
-        station_id = self.get_station_id(lat, lon)
-        if station_id:
+        # Markers carry their station ID, so no coordinate matching is needed
+        return self.select_station(marker.station_id)
+
+    def select_station(self, station_id):
+        station = self.get_station(station_id)
+        if station:
+            lat, lon = station
             print(f"Station ID for marker at ({lat}, {lon}): {station_id}")
+            self.station_id = station_id
             self.ids.station_id.text = f"{station_id}"
+            # Start downloading the forecast before the user asks for it
+            app = MDApp.get_running_app()
+            if app.nwm is not None:
+                request = ("nwm", station_id, NWM_CONFIGURATION)
+                app.fetcher.prefetch(request, app.get_streamflow, station_id, None, NWM_CONFIGURATION)
+            else:
+                for site in FORECAST_SITES:
+                    request = (FORECAST_URL, site, FORECAST_VARIABLE, FORECAST_START, FORECAST_END)
+                    app.fetcher.prefetch(request, app.get_values, *request)
         else:
-            print(f"No station ID found for the marker at ({lat}, {lon}).")
+            print(f"No station found for ID {station_id}.")
         return station_id
+
+    def on_cluster_press(self, marker):
+        if marker.count == 1:
+            return self.on_marker_press(marker)
+
+        # Zoom in around the cluster until it splits into smaller clusters or stations
+        main_map = self.ids.main_map
+        main_map.center_on(float(marker.lat), float(marker.lon))
+        main_map.zoom = min(int(main_map.zoom) + 2, CLUSTER_MAX_ZOOM + 1)
     
     def create_markers(self):
-        # Initial creation of markers
-        self.update_markers()
+        # Initial creation of markers, without waiting for the map to settle
+        self.scheduler.request_now()
+
+    def get_marker_layer(self):
+        # Iterate over the children of the MapView widget to find the MarkerMapLayer
+        for child in self.ids.main_map.children:
+            if isinstance(child, MarkerMapLayer):
+                return child
+
+        # If MarkerMapLayer is not found, create a new one and add it to the MapView
+        marker_map_layer = MarkerMapLayer()
+        self.ids.main_map.add_layer(marker_map_layer)
+        return marker_map_layer
+
+    def configure_cluster(self, marker, cluster):
+        marker.station_id = cluster.station_id
+        marker.count = cluster.count
+        marker.source = "icon2.png" if cluster.count == 1 else "icon.png"
 
-    def update_markers(self):
-        # Get the bounding box coordinates
-        bbox = self.ids.main_map.get_bbox()
+    def viewport_state(self):
+        # Get the bounding box coordinates and zoom level on the main thread
+        return self.ids.main_map.get_bbox(), self.ids.main_map.zoom
+
+    @perf.timed("viewport.query")
+    def query_viewport(self, state):
+        # Runs on the scheduler's worker thread; touches no widgets
+        bbox, zoom = state
         min_lat, min_lon, max_lat, max_lon = bbox
 
-        # Retrieve latitudes and longitudes
-        latitudes, longitudes = self.get_lat_lon()
+        # Overview zooms draw pre-rendered tiles and need no query at all
+        if zoom <= OVERLAY_MAX_ZOOM and self.reach_tiles is not None and self.reach_tiles.covers(zoom):
+            return "tiles", None
+
+        # Low zoom levels render aggregate cluster markers only
+        if zoom <= CLUSTER_MAX_ZOOM:
+            # Pad the viewport by half a screen so short pans stay populated
+            lat_pad = (max_lat - min_lat) / 2
+            lon_pad = (max_lon - min_lon) / 2
+            clusters = self.get_clusters().get_clusters(min_lat - lat_pad, min_lon - lon_pad, max_lat + lat_pad, max_lon + lon_pad, zoom)
+            return "clusters", self.center_first(bbox, [(c.cluster_id, c.lat, c.lon, c) for c in clusters])
+
+        # Only reaches of at least this zoom level's order are returned, as arrays for the station layer
+        index = self.get_index()
+        found = index.query_indices(
+            min_lat - 0.5, min_lon - 0.5, max_lat + 0.5, max_lon + 0.5, limit=MAX_STATIONS, min_rank=min_order_for_zoom(zoom)
+        )
+        return "stations", (index.station_ids[found], index.lats[found], index.lons[found])
+
+    def center_first(self, bbox, items):
+        # Markers are added a batch per frame; the ones in view come first
+        min_lat, min_lon, max_lat, max_lon = bbox
+        center_lat, center_lon = (min_lat + max_lat) / 2, (min_lon + max_lon) / 2
+        items.sort(key=lambda item: (item[1] - center_lat) ** 2 + (item[2] - center_lon) ** 2)
+        return items
+
+    @perf.timed("viewport.apply")
+    def apply_viewport(self, state, result):
+        bbox, zoom = state
+        mode, items = result
 
         # Calculate marker size based on the zoom level
-        zoom = self.ids.main_map.zoom
         marker_size = 400 / zoom
 
-        # Iterate over the children of the MapView widget to find the MarkerMapLayer
-        for child in self.ids.main_map.children:
-            if isinstance(child, MarkerMapLayer):
-                marker_map_layer = child
-                break
+        if self.cluster_markers is None:
+            self.cluster_markers = MarkerManager(
+                self.get_marker_layer(), self.on_cluster_press, marker_class=ClusterMarker, configure=self.configure_cluster,
+                on_loaded=self.on_markers_loaded,
+            )
+            self.station_layer = StationLayer(self.select_station)
+            self.ids.main_map.add_layer(self.station_layer)
+            # The first frame showing markers is when the map becomes usable
+            startup.mark_next_frame("interactive")
+            # Build the tap index in the background before the first tap
+            self.prefetch_nearest()
+
+        if self.reach_tiles is not None:
+            self.reach_tiles.set_active(mode == "tiles")
+
+        # Cluster ids include their zoom level, so a zoom change replaces every cluster.
+        # Stations are redrawn as one batch.
+        if mode == "tiles":
+            self.station_layer.unload()
+            self.cluster_markers.clear()
+            self.on_markers_loaded()
+        elif mode == "clusters":
+            self.station_layer.unload()
+            self.cluster_markers.sync(items, marker_size)
+        else:
+            self.cluster_markers.clear()
+            self.station_layer.set_points(*items, marker_size=marker_size)
+            self.on_markers_loaded()
+
+    def add_reach_tiles(self):
+        # Added before any marker layer so the reach tiles stay beneath the markers
+        layer = OverlayTileLayer(OVERLAY_DIR, OVERLAY_CACHE_KEY)
+        if len(layer):
+            self.reach_tiles = layer
+            self.ids.main_map.add_layer(layer)
         else:
-            # If MarkerMapLayer is not found, create a new one and add it to the MapView
-            marker_map_layer = MarkerMapLayer()
-            self.ids.main_map.add_layer(marker_map_layer)
-
-        # Remove markers that are outside the visible area
-        markers_to_remove = []
-        for marker in marker_map_layer.children:
-            lat, lon = float(marker.lat), float(marker.lon)
-            if not (min_lat - 0.5 <= lat <= max_lat + 0.5 and min_lon - 0.5 <= lon <= max_lon + 0.5):
-                markers_to_remove.append(marker)
-        for marker in markers_to_remove:
-            marker_map_layer.remove_widget(marker)
-            self.created_markers.remove((float(marker.lat), float(marker.lon)))
-
-        # Add new markers within the visible area
-        for lat, lon in zip(latitudes, longitudes):
-            if min_lat - 0.5 <= lat <= max_lat + 0.5 and min_lon - 0.5 <= lon <= max_lon + 0.5:
-                if (lat, lon) not in self.created_markers:
-                    new_marker = MapMarker(lat=str(lat), lon=str(lon), source="icon2.png")
-                    new_marker.size = [marker_size for _ in range(2)]  # Changed size assignment
-                    new_marker.bind(on_press=self.on_marker_press)
-                    marker_map_layer.add_widget(new_marker)
-                    self.created_markers.add((lat, lon))  # Add coordinates to the set
-
-    def on_bbox_change(self, instance, value):
+            print(f"No reach tiles in {OVERLAY_DIR}; run render_overlay.py to skip markers at overview zooms")
+
+    def on_markers_loaded(self):
+        # Reported once the frame showing every marker of the first viewport is drawn
+        if not startup.reported:
+            startup.mark_next_frame("markers_loaded", startup.report)
+
+    def show_perf_overlay(self):
+        self.overlay = Label(
+            color=(0, 0, 0, 1), font_size="11sp", halign="left", valign="bottom",
+            size_hint=(1, None), height=48, pos_hint={"x": 0.03, "y": 0.12},
+        )
+        self.overlay.bind(size=lambda label, size: setattr(label, "text_size", size))
+        self.add_widget(self.overlay)
+        Clock.schedule_interval(lambda dt: perf.observe("frame", dt, trace=False), 0)
+        Clock.schedule_interval(self.update_perf_overlay, 0.5)
+
+    def update_perf_overlay(self, dt):
+        frame = perf.recorder.stat("frame") or {"last": 0.0, "max": 0.0}
+        query = perf.recorder.stat("viewport.query") or {"last": 0.0}
+        markers = len(self.station_layer or ()) + len(self.cluster_markers or ())
+        self.overlay.text = (
+            f"frame {frame['last'] * 1000:.0f} ms (max {frame['max'] * 1000:.0f}), {Clock.get_fps():.0f} fps\n"
+            f"markers {markers}, query {query['last'] * 1000:.1f} ms\n"
+            f"tiles {perf.recorder.counter('tiles.hit')} hit / {perf.recorder.counter('tiles.miss')} miss"
+        )
+
+    def on_bbox_change(self, *args):
         # Update markers when the bounding box changes
-        self.update_markers()
+        self.scheduler.request()
 
 class ForecastScreen(MDScreen):
-    def display_plot(self, datetimes, values):
-        # Create a new figure
-        plt.figure(figsize=(7, 6))
-        plt.plot(datetimes, values, marker='o')
-        plt.title('Carson Beach Air Temp')
-        plt.xlabel('Date')
-        plt.ylabel('Temp (Celcius Degrees)')
-        plt.grid(True)
-        plt.tight_layout()
-        
-        # Convert the plot to a Kivy-compatible texture
-        canvas = FigureCanvasKivyAgg(plt.gcf())
-        self.ids.plot_container.add_widget(canvas)
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.series = {}  # site -> (times, values) arrays received so far
+        self.plot = None  # Reused across visits
+        self.message = MDLabel(halign="center")
+
+    def display_plot(self, series, labels=('Carson Beach Air Temp', 'Date (UTC)', 'Temp (Celcius Degrees)')):
+        # Created once; later calls only replace the line data
+        if self.plot is None:
+            from plot_canvas import HydrographPlot
+            self.plot = HydrographPlot(*labels)
+        self.plot.set_labels(*labels)
+
+        container = self.ids.plot_container
+        if self.message.parent is not None:
+            container.remove_widget(self.message)
+        if self.plot.canvas.parent is None:
+            container.add_widget(self.plot.canvas)
+        self.plot.update(series)
+
+    def show_message(self, text):
+        self.message.text = text
+        self.ids.plot_container.clear_widgets()
+        self.ids.plot_container.add_widget(self.message)
+
+    def on_forecast(self, site, result):
+        # Redraw as each site arrives instead of waiting for the whole batch
+        self.series[site] = result
+        self.display_plot(self.series)
 
-    def get_data_from_hydroserver(self):
-        # Connect to the Massachusetts Water Resources Authority (MWRA) HydroServer service
-        url = "https://hydroportal.cuahsi.org/MWRA/cuahsi_1_1.asmx?WSDL"
-        site_full_code = "MWRA:36"  # Notice that "full code"
-        variable_full_code = "MWRA:Temp"  # Notice that "full code"
-        start_date = "2005-12-04"
-        end_date = "2006-07-06"
+    def on_streamflow(self, station_id, result):
+        self.series = {f"Reach {station_id}": result}
+        self.display_plot(self.series, (f'NWM {NWM_CONFIGURATION.replace("_", " ")} forecast', 'Date (UTC)', 'Streamflow (m³/s)'))
 
-        # Get the WaterMLOperations object
-        water = waterML.WaterMLOperations(url)
-        sites = water.GetSites()
-        data = water.GetValues(site_full_code, variable_full_code, start_date, end_date)["values"]
+    def on_streamflow_error(self, station_id, error):
+        self.on_forecast_error(station_id, error)
+        self.show_message("Forecast unavailable")
 
-        # Extract datetimes and values from the data object
-        datetimes = [datetime.strptime(d['dateTime'], '%Y-%m-%d %H:%M:%S') for d in data]
-        values = [d['dataValue'] for d in data]
+    def on_forecast_error(self, site, error):
+        print(f"Forecast request for {site} failed: {error}")
 
-        return datetimes, values
+    def on_forecast_complete(self):
+        if not self.series:
+            self.show_message("Forecast unavailable")
 
     def on_pre_enter(self, *args):
-        # Get data from the HydroServer
-        datetimes, values = self.get_data_from_hydroserver()
-        
-        # Display the plot in the ForecastScreen
-        self.display_plot(datetimes, values)
+        # Show a loading state right away and fetch from the HydroServer in the background
+        self.series = {}
+        self.show_message("Loading forecast...")
+        app = MDApp.get_running_app()
+        # Load matplotlib in the background while the forecast downloads
+        app.fetcher.prefetch(("import", "plot_canvas"), importlib.import_module, "plot_canvas")
+        if app.nwm is not None:
+            station_id = self.manager.get_screen("map").station_id
+            if station_id is None:
+                self.show_message("Select a reach on the map first")
+                return
+            request = ("nwm", station_id, NWM_CONFIGURATION)
+            app.fetcher.fetch(
+                request, app.get_streamflow, station_id, None, NWM_CONFIGURATION,
+                on_result=partial(self.on_streamflow, station_id),
+                on_error=partial(self.on_streamflow_error, station_id),
+            )
+            return
+        app.fetcher.fetch_batch(
+            app.get_values, FORECAST_URL, FORECAST_SITES, FORECAST_VARIABLE, FORECAST_START, FORECAST_END,
+            on_result=self.on_forecast, on_error=self.on_forecast_error, on_complete=self.on_forecast_complete,
+            max_concurrency=FORECAST_CONCURRENCY,
+        )
+
+    def on_leave(self, *args):
+        # Results for a screen the user already left are not needed anymore
+        MDApp.get_running_app().fetcher.cancel()
 
     # Use this later when the initial API is back on service.
     # def get_station_id_from_map(self):
@@ -175,6 +412,18 @@ class nwmApp(MDApp):
     self.theme_cls.theme_style = "Light"
     self.theme_cls.primary_palette = "Peru"
 
+    # Background worker for HydroServer requests, backed by a local time-series cache
+    self.fetcher = ForecastFetcher()
+    self.cache = TimeSeriesCache("timeseries_cache.db")
+    self.nwm = NWMSource(NWM_ROOT) if NWM_ROOT else None
+    if self.nwm is not None:
+      # Cycles ingested into the reach store are read as one row per reach
+      self.get_streamflow = partial(stored_get_streamflow, ReachStore(NWM_STORE_DIR), self.nwm)
+
+    # Bounded tile cache for the map, trimmed periodically
+    self.tile_index = TileCacheIndex("cache", default_quota=TILE_CACHE_QUOTA, max_age=TILE_CACHE_MAX_AGE)
+    Clock.schedule_interval(lambda dt: self.tile_index.enforce(), 60)
+
     # Create a ScreenManager and add screens
     screen_manager = ScreenManager()
     map_screen = MapScreen(name="map")
@@ -182,15 +431,41 @@ class nwmApp(MDApp):
     screen_manager.add_widget(map_screen)
     screen_manager.add_widget(forecast_screen)
     
-    # Schedule the creation of markers and binding of events after a short delay
-    Clock.schedule_once(lambda dt: self.setup_map_screen(map_screen), .1)
+    if PERF_OVERLAY:
+      map_screen.show_perf_overlay()
+    if PERF_TRACE_PATH:
+      Clock.schedule_interval(lambda dt: perf.recorder.export_trace(PERF_TRACE_PATH), PERF_TRACE_INTERVAL)
 
+    startup.mark("build")
     return screen_manager
+
+  def on_start(self):
+    self.setup_map_screen(self.root.get_screen("map"))
+    # Markers are queried once the first frame has been laid out and drawn
+    startup.mark_next_frame("first_frame", self.root.get_screen("map").create_markers)
+
+  def get_values(self, *request):
+    # pywaterml is only imported once a forecast is requested
+    import hydroserver
+    return cached_get_values(self.cache, hydroserver.get_values, *request)
   
+  def on_stop(self):
+    # Workers may still be reading the cache or the database; let them finish before closing either
+    self.root.get_screen("map").scheduler.shutdown(wait=True)
+    self.fetcher.shutdown(wait=True)
+    if self.nwm is not None:
+      self.nwm.shutdown()
+    self.cache.close()
+    db.close()
+    if PERF_TRACE_PATH:
+      perf.recorder.export_trace(PERF_TRACE_PATH)
+
   def setup_map_screen(self, map_screen):
-        map_screen.create_markers()  # Create initial markers
-        map_screen.bind(on_bbox_change=map_screen.update_markers)  # Bind bbox change event
-        map_screen.ids.main_map.bind(on_zoom=map_screen.on_zoom)  # Bind zoom change event
+        map_screen.ids.main_map.map_source = CachedMapSource(self.tile_index, cache_dir=self.tile_index.cache_dir)
+        map_screen.add_reach_tiles()
+        map_screen.ids.main_map.bind(on_map_relocated=map_screen.on_bbox_change)  # Bind bbox change event
+        map_screen.ids.main_map.bind(zoom=map_screen.on_zoom)  # Bind zoom change event
+        map_screen.ids.main_map.bind(on_touch_up=map_screen.on_map_touch_up)  # Tap anywhere to pick a reach
 
 
 if __name__ == '__main__':
@@ -1,57 +1,26 @@
-import sqlite3
-
 from kivymd.app import MDApp
-from kivy.lang import Builder
-from kivy.properties import ObjectProperty, StringProperty
 from kivy.core.window import Window
 from kivymd.uix.screenmanager import MDScreenManager
 from kivymd.uix.screen import MDScreen
-from kivy_garden.mapview import MapMarkerPopup, MapMarker, MapView, MarkerMapLayer
+from kivy_garden.mapview import MapMarker, MarkerMapLayer
 from kivy.clock import Clock
-from pywaterml import waterML
-from datetime import datetime
-import matplotlib.pyplot as plt
-from kivy.garden.matplotlib.backend_kivyagg import FigureCanvasKivyAgg # type: ignore
-import os
+import perf
+from streamdb import StreamDB
+
+db = StreamDB.from_env("originalsample.db")
 
 class MapScreen(MDScreen):
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
         self.station_id = None
 
-    def get_lat_lon(self):
-        latitudes = []
-        longitudes = []
-        
-        conn = sqlite3.connect("originalsample.db")
-        cursor = conn.cursor()
-        cursor.execute("SELECT * FROM StreamMidpoints")
-        records = cursor.fetchall()
-
-        for record in records:
-            latitudes.append(record[1])
-            longitudes.append(record[2])
-
-        conn.close()
-
-        return latitudes, longitudes
+    def get_points(self):
+        return db.all_points()
     
-    def get_station_id(self, lat, lon):
-        conn = sqlite3.connect("originalsample.db")
-        cursor = conn.cursor()
-        cursor.execute("SELECT station_id FROM StreamMidpoints WHERE lat = ? AND lon = ?", (lat, lon))
-        result = cursor.fetchone()
-        conn.close()
-        
-        if result:
-            return result[0]
-        else:
-            return None
-        
     def on_marker_press(self, marker):
         lat = float(marker.lat)
         lon = float(marker.lon)
-        station_id = self.get_station_id(lat, lon)
+        station_id = marker.station_id
         if station_id:
             print(f"Station ID for marker at ({lat}, {lon}): {station_id}")
             self.ids.station_id.text = f"{station_id}"
@@ -59,12 +28,12 @@ class MapScreen(MDScreen):
             print(f"No station ID found for the marker at ({lat}, {lon}).")
         return station_id
 
+    @perf.timed("markers.create")
     def create_markers(self):
         bbox = self.ids.main_map.get_bbox()
         min_lat, min_lon, max_lat, max_lon = bbox
 
-        latitudes, longitudes = self.get_lat_lon()
-        print(f"This is the bounding box: {bbox}")
+        points = self.get_points()
 
         zoom = self.ids.main_map.zoom
         marker_size = 700 / zoom
@@ -77,15 +46,20 @@ class MapScreen(MDScreen):
             marker_map_layer = MarkerMapLayer()
             self.ids.main_map.add_layer(marker_map_layer)
 
-        for lat, lon in zip(latitudes, longitudes):
+        for station_id, lat, lon in points:
             if min_lat - 0.5 <= lat <= max_lat + 0.5 and min_lon - 0.5 <= lon <= max_lon + 0.5:
                 new_marker = MapMarker(lat=str(lat), lon=str(lon), source="icon2.png")
+                new_marker.station_id = station_id
                 new_marker.size = [marker_size for size in new_marker.texture_size]
                 new_marker.bind(on_press=self.on_marker_press)
                 marker_map_layer.add_widget(new_marker)
 
 class ForecastScreen(MDScreen):
     def display_plot(self, datetimes, values):
+        # Plotting is only needed once the forecast screen opens
+        import matplotlib.pyplot as plt
+        from kivy.garden.matplotlib.backend_kivyagg import FigureCanvasKivyAgg # type: ignore
+
         plt.figure(figsize=(7, 6))
         plt.plot(datetimes, values, marker='o')
         plt.title('Carson Beach Air Temp')
@@ -98,6 +72,9 @@ class ForecastScreen(MDScreen):
         self.ids.plot_container.add_widget(canvas)
 
     def get_data_from_hydroserver(self):
+        from datetime import datetime
+        from pywaterml import waterML
+
         url = "https://hydroportal.cuahsi.org/MWRA/cuahsi_1_1.asmx?WSDL"
         site_full_code = "MWRA:36"
         variable_full_code = "MWRA:Temp"
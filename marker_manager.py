@@ -0,0 +1,111 @@
+import time
+
+from kivy.clock import Clock
+from kivy_garden.mapview import MapMarker
+
+import perf
+
+
+class MarkerManager:
+    # Keeps one marker per visible key (a station_id or cluster_id). Each
+    # sync() diffs the new set of keys against the visible ones, so only the
+    # markers that enter or leave the viewport are touched. Markers that leave
+    # are parked in a pool and reused for the next ones that enter.
+    #
+    # New markers are added in time-sliced batches, at most `frame_budget`
+    # seconds per frame, so a large viewport never stalls a frame; items are
+    # added in the order given, nearest the viewport center first.
+    def __init__(self, layer, on_press, marker_class=MapMarker, source="icon2.png", configure=None, max_pool=500,
+                 frame_budget=0.008, on_loaded=None):
+        self.layer = layer
+        self.on_press = on_press
+        self.marker_class = marker_class
+        self.source = source
+        self.configure = configure  # optional callback(marker, data) for per-item state
+        self.max_pool = max_pool
+        self.frame_budget = frame_budget
+        self.on_loaded = on_loaded  # optional callback() once every pending marker is added
+        self.visible = {}  # key -> marker
+        self.pool = []
+        self.size = None
+        self.pending = []  # (key, lat, lon, data) still to be added, next one last
+        self.event = None
+
+    def __len__(self):
+        return len(self.visible)
+
+    def sync(self, items, size):
+        # items: iterable of (key, lat, lon, data)
+        items = list(items)
+        keys = {item[0] for item in items}
+
+        removed = [key for key in self.visible if key not in keys]
+        for key in removed:
+            self.release(key)
+        perf.count("markers.removed", len(removed))
+
+        if size != self.size:
+            self.size = size
+            for marker in self.visible.values():
+                marker.size = (size, size)
+
+        # Replaces whatever a previous sync had not added yet
+        self.pending = [item for item in items if item[0] not in self.visible]
+        added = [item[0] for item in self.pending]
+        self.pending.reverse()
+        if self.event is not None:
+            self.event.cancel()
+            self.event = None
+        self.add_pending()
+        return added, removed
+
+    def add_pending(self, *args):
+        self.event = None
+        mapview = self.layer.parent
+        started = time.perf_counter()
+        deadline = started + self.frame_budget
+        added = 0
+        while self.pending:
+            key, lat, lon, data = self.pending.pop()
+            marker = self.acquire()
+            marker.key = key
+            marker.lat = lat
+            marker.lon = lon
+            marker.size = (self.size, self.size)
+            if self.configure is not None:
+                self.configure(marker, data)
+            self.layer.add_widget(marker)
+            if mapview is not None:
+                self.layer.set_marker_position(mapview, marker)
+            self.visible[key] = marker
+            added += 1
+            if time.perf_counter() >= deadline:
+                break
+        perf.observe("markers.add_batch", time.perf_counter() - started, started)
+        perf.count("markers.added", added)
+
+        if self.pending:
+            self.event = Clock.schedule_once(self.add_pending, 0)
+        elif self.on_loaded is not None:
+            self.on_loaded()
+
+    def acquire(self):
+        if self.pool:
+            return self.pool.pop()
+        marker = self.marker_class(source=self.source)
+        marker.bind(on_press=self.on_press)
+        return marker
+
+    def release(self, key):
+        marker = self.visible.pop(key)
+        self.layer.remove_widget(marker)
+        if len(self.pool) < self.max_pool:
+            self.pool.append(marker)
+
+    def clear(self):
+        self.pending = []
+        if self.event is not None:
+            self.event.cancel()
+            self.event = None
+        for key in list(self.visible):
+            self.release(key)
@@ -0,0 +1,121 @@
+import heapq
+import math
+
+import numpy as np
+
+from point_store import EARTH_RADIUS_KM
+
+
+def to_unit_sphere(lats, lons):
+    # Straight-line (chord) distance between these points grows with the
+    # great-circle distance, so nearest on the sphere is nearest on the ground
+    lat = np.radians(np.asarray(lats, dtype=np.float64))
+    lon = np.radians(np.asarray(lons, dtype=np.float64))
+    return np.column_stack((np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon), np.sin(lat)))
+
+
+def km_to_chord(km):
+    return 2.0 * math.sin(min(km / EARTH_RADIUS_KM, math.pi) / 2.0)
+
+
+def chord_to_km(chord):
+    return 2.0 * EARTH_RADIUS_KM * np.arcsin(np.minimum(np.asarray(chord) / 2.0, 1.0))
+
+
+def ground_resolution_km(lat, zoom, tile_size=256, scale=1.0):
+    # Kilometres covered by one screen pixel of a web mercator map
+    return math.cos(math.radians(lat)) * 2 * math.pi * EARTH_RADIUS_KM / (tile_size * 2 ** zoom * scale)
+
+
+class NearestIndex:
+    # Static KD-tree over stations as points on the unit sphere. Nodes split
+    # their widest axis at the median, so the points of every node are one
+    # contiguous slice of the reordered arrays; leaves are scanned with
+    # NumPy and subtrees are pruned by the distance to their bounding box.
+    def __init__(self, station_ids, lats, lons, leaf_size=32):
+        points = to_unit_sphere(lats, lons)
+        order = np.arange(len(points))
+        self.starts, self.ends, self.children, self.boxes = [], [], [], []
+
+        def add(start, end):
+            self.starts.append(start)
+            self.ends.append(end)
+            self.children.append(None)
+            self.boxes.append(None)
+            return len(self.starts) - 1
+
+        stack = [add(0, len(points))] if len(points) else []
+        while stack:
+            node = stack.pop()
+            start, end = self.starts[node], self.ends[node]
+            segment = points[order[start:end]]
+            lo, hi = segment.min(axis=0), segment.max(axis=0)
+            self.boxes[node] = (tuple(lo.tolist()), tuple(hi.tolist()))
+            if end - start <= leaf_size:
+                continue
+            axis = int(np.argmax(hi - lo))
+            middle = (end - start) // 2
+            order[start:end] = order[start:end][np.argpartition(segment[:, axis], middle)]
+            left, right = add(start, start + middle), add(start + middle, end)
+            self.children[node] = (left, right)
+            stack.extend((left, right))
+
+        self.points = points[order]
+        self.station_ids = np.asarray(station_ids)[order]
+
+    @classmethod
+    def from_store(cls, store, leaf_size=32):
+        return cls(store.station_ids, store.lats, store.lons, leaf_size=leaf_size)
+
+    def __len__(self):
+        return len(self.station_ids)
+
+    def _box_distance2(self, node, q):
+        lo, hi = self.boxes[node]
+        total = 0.0
+        for i in range(3):
+            if q[i] < lo[i]:
+                total += (lo[i] - q[i]) ** 2
+            elif q[i] > hi[i]:
+                total += (q[i] - hi[i]) ** 2
+        return total
+
+    def nearest(self, lat, lon, k=1, max_km=None):
+        # Up to k (station_id, distance_km) pairs, nearest first, optionally
+        # only those within max_km
+        if not self.starts or k < 1:
+            return []
+        q = to_unit_sphere([lat], [lon])[0]
+        q_tuple = tuple(q.tolist())
+        limit = km_to_chord(max_km) ** 2 if max_km is not None else math.inf
+        bound = limit
+        best = []  # max-heap of (-distance2, position)
+
+        nodes = [(self._box_distance2(0, q_tuple), 0)]
+        while nodes:
+            distance2, node = heapq.heappop(nodes)
+            if distance2 > bound:
+                break
+            children = self.children[node]
+            if children is not None:
+                for child in children:
+                    child_distance2 = self._box_distance2(child, q_tuple)
+                    if child_distance2 <= bound:
+                        heapq.heappush(nodes, (child_distance2, child))
+                continue
+
+            start, end = self.starts[node], self.ends[node]
+            d2 = ((self.points[start:end] - q) ** 2).sum(axis=1)
+            for i in np.flatnonzero(d2 <= bound).tolist():
+                entry = (-float(d2[i]), start + i)
+                if len(best) < k:
+                    heapq.heappush(best, entry)
+                elif entry > best[0]:
+                    heapq.heapreplace(best, entry)
+            if len(best) == k:
+                bound = min(limit, -best[0][0])
+
+        best.sort(reverse=True)
+        positions = [position for _, position in best]
+        distances = chord_to_km(np.sqrt([-negative for negative, _ in best])) if best else []
+        return [(self.station_ids[position].item(), float(distance)) for position, distance in zip(positions, distances)]
@@ -0,0 +1,199 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+import numpy as np
+
+import perf
+
+# configuration -> (directory, product in the file name, forecast hours)
+CONFIGURATIONS = {
+    "short_range": ("short_range", "short_range.channel_rt", range(1, 19)),
+    "medium_range": ("medium_range_mem1", "medium_range.channel_rt_1", range(1, 241)),
+    "long_range": ("long_range_mem1", "long_range.channel_rt_1", range(6, 721, 6)),
+}
+
+# Hours of the day each configuration is issued at
+CYCLES = {
+    "short_range": range(24),
+    "medium_range": range(0, 24, 6),
+    "long_range": range(0, 24, 6),
+}
+
+
+def is_remote(path):
+    return "://" in path and not path.startswith("file://")
+
+
+def to_reference_time(value):
+    # Model cycles start on the hour, in UTC
+    return np.datetime64(value, "h")
+
+
+def forecast_path(root, reference_time, configuration, hour):
+    # Same layout as the NOMADS and cloud mirrors:
+    # nwm.20240101/short_range/nwm.t00z.short_range.channel_rt.f001.conus.nc
+    directory, product, _ = CONFIGURATIONS[configuration]
+    reference_time = to_reference_time(reference_time)
+    day = str(reference_time.astype("datetime64[D]")).replace("-", "")
+    cycle = int((reference_time - reference_time.astype("datetime64[D]")) / np.timedelta64(1, "h"))
+    name = f"nwm.t{cycle:02d}z.{product}.f{hour:03d}.conus.nc"
+    return "/".join([root.rstrip("/"), f"nwm.{day}", directory, name])
+
+
+@contextmanager
+def open_channel_rt(path):
+    # netCDF4 for local files. Object-store URLs (s3://, gs://, https://) go
+    # through fsspec and h5netcdf, which fetch only the HDF5 chunks a read
+    # touches instead of downloading the whole national file.
+    if is_remote(path):
+        import fsspec
+        import h5netcdf
+
+        with fsspec.open(path, "rb") as f, h5netcdf.File(f, "r") as dataset:
+            yield dataset
+    else:
+        import netCDF4
+
+        with netCDF4.Dataset(path.replace("file://", "", 1)) as dataset:
+            # Scaling and fill values are applied by decode() for both backends
+            dataset.set_auto_maskandscale(False)
+            yield dataset
+
+
+def attributes(variable):
+    attrs = getattr(variable, "attrs", None)  # h5netcdf
+    if attrs is None:
+        attrs = {name: variable.getncattr(name) for name in variable.ncattrs()}  # netCDF4
+    return attrs
+
+
+def decode(variable, raw):
+    # streamflow is stored as int32 hundredths of m3/s with a fill value
+    attrs = attributes(variable)
+    values = np.asarray(raw).astype(np.float64)
+    fill = attrs.get("_FillValue", attrs.get("missing_value"))
+    if fill is not None:
+        values[np.asarray(raw) == np.asarray(fill).item()] = np.nan
+    return values * float(attrs.get("scale_factor", 1.0)) + float(attrs.get("add_offset", 0.0))
+
+
+class FeatureLookup:
+    # Maps feature_ids (StreamMidpoints station IDs) to positions along the
+    # `feature` dimension. Every channel_rt file of one model version has
+    # the same feature_id order, so it is read once per length and reused.
+    def __init__(self):
+        self.tables = {}  # n_features -> (sorted feature_ids, positions)
+        self.lock = threading.Lock()
+
+    def table(self, dataset):
+        variable = dataset.variables["feature_id"]
+        size = variable.shape[0]
+        with self.lock:
+            table = self.tables.get(size)
+        if table is None:
+            ids = np.asarray(variable[:], dtype=np.int64)
+            order = np.argsort(ids, kind="stable")
+            table = (ids[order], order)
+            with self.lock:
+                self.tables[size] = table
+        return table
+
+    def match(self, dataset, feature_ids):
+        # (positions, found) for every requested feature_id; positions of
+        # ids that are not in the file are meaningless
+        sorted_ids, order = self.table(dataset)
+        feature_ids = np.asarray(feature_ids, dtype=np.int64)
+        found = np.minimum(np.searchsorted(sorted_ids, feature_ids), len(sorted_ids) - 1)
+        return order[found], sorted_ids[found] == feature_ids
+
+    def positions(self, dataset, feature_ids):
+        positions, found = self.match(dataset, feature_ids)
+        if not found.all():
+            missing = np.asarray(feature_ids, dtype=np.int64)[~found]
+            raise KeyError(f"feature_id not in NWM output: {missing.tolist()}")
+        return positions
+
+
+def read_streamflow(dataset, positions=None):
+    # Reads only the requested feature positions. HDF5 needs strictly
+    # increasing indices, so unique positions are read in order and then
+    # expanded back to the order they were requested in.
+    variable = dataset.variables["streamflow"]
+    if positions is None:
+        return decode(variable, variable[:])
+    unique, inverse = np.unique(np.asarray(positions, dtype=np.int64), return_inverse=True)
+    raw = variable[unique] if len(unique) > 1 else variable[unique[0]:unique[0] + 1]
+    return decode(variable, raw)[inverse]
+
+
+class NWMSource:
+    # National Water Model channel routing forecasts from a local directory
+    # or an object-store mirror, e.g. "s3://noaa-nwm-pds" or
+    # "https://storage.googleapis.com/national-water-model". A reach's
+    # forecast touches one small slice per forecast hour; the hourly files
+    # are read concurrently.
+    def __init__(self, root, max_workers=8):
+        self.root = root
+        self.lookup = FeatureLookup()
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="nwm")
+
+    def path(self, reference_time, configuration, hour):
+        return forecast_path(self.root, reference_time, configuration, hour)
+
+    def exists(self, path):
+        if is_remote(path):
+            import fsspec
+
+            fs, _, (location,) = fsspec.get_fs_token_paths(path)
+            return fs.exists(location)
+        return os.path.exists(path.replace("file://", "", 1))
+
+    def latest_cycle(self, configuration="short_range", days=2, now=None):
+        # Most recent cycle whose last forecast hour has been published
+        hours = CONFIGURATIONS[configuration][2]
+        now = to_reference_time(now if now is not None else np.datetime64("now"))
+        today = now.astype("datetime64[D]")
+        for day in range(days + 1):
+            date = today - np.timedelta64(day, "D")
+            for cycle in reversed(CYCLES[configuration]):
+                reference_time = date + np.timedelta64(cycle, "h")
+                if reference_time <= now and self.exists(self.path(reference_time, configuration, hours[-1])):
+                    return reference_time
+        return None
+
+    def read_hour(self, reference_time, configuration, hour, feature_ids):
+        path = self.path(reference_time, configuration, hour)
+        try:
+            with perf.timer("nwm.read_hour"), open_channel_rt(path) as dataset:
+                return read_streamflow(dataset, self.lookup.positions(dataset, feature_ids))
+        except FileNotFoundError:
+            return None
+
+    def get_streamflow(self, feature_ids, reference_time=None, configuration="short_range"):
+        # Returns (valid times as datetime64[s] UTC, streamflow in m3/s) for
+        # one feature_id, or a (hours, features) array for a list of them.
+        # Forecast hours that are not published are left out.
+        single = np.ndim(feature_ids) == 0
+        feature_ids = np.atleast_1d(np.asarray(feature_ids, dtype=np.int64))
+        if reference_time is None:
+            reference_time = self.latest_cycle(configuration)
+            if reference_time is None:
+                raise FileNotFoundError(f"No complete {configuration} cycle under {self.root}")
+        reference_time = to_reference_time(reference_time)
+
+        hours = list(CONFIGURATIONS[configuration][2])
+        flows = list(self.executor.map(
+            lambda hour: self.read_hour(reference_time, configuration, hour, feature_ids), hours
+        ))
+        found = [i for i, values in enumerate(flows) if values is not None]
+        if not found:
+            raise FileNotFoundError(f"No {configuration} output for cycle {reference_time} under {self.root}")
+
+        times = (reference_time + np.asarray([hours[i] for i in found], dtype="timedelta64[h]")).astype("datetime64[s]")
+        values = np.stack([flows[i] for i in found])
+        return times, values[:, 0] if single else values
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,122 @@
+import math
+import os
+from collections import OrderedDict
+
+from kivy.core.image import Image as CoreImage
+from kivy.graphics import Color, InstructionGroup, PopMatrix, PushMatrix, Rectangle, Translate
+from kivy_garden.mapview import MapLayer
+
+import perf
+from seed_tiles import lat_to_tile, lon_to_tile
+from station_layer import map_transform
+from tile_cache import parse_tile_filename, tile_filename
+
+
+class OverlayTileLayer(MapLayer):
+    # Draws the pre-rendered reach tiles written by render_overlay.py as a
+    # second tile layer over the basemap, one Rectangle per visible tile.
+    # The directory is listed once, so a tile with no reaches costs a set
+    # lookup instead of a failed file open. Like the station layer, a pan
+    # only moves a Translate until another tile comes into view.
+    def __init__(self, directory="overlay", cache_key="nwm-streams", max_textures=128, **kwargs):
+        super().__init__(**kwargs)
+        self.directory = directory
+        self.cache_key = cache_key
+        self.max_textures = max_textures
+        self.available = set()  # file names of the rendered tiles
+        self.zooms = None  # (min_zoom, max_zoom) rendered, missing tiles in this range are empty
+        self.textures = OrderedDict()  # name -> texture, least recently drawn first
+        self.active = False
+        self.drawn = None  # (zoom, tile range) of the current rectangles
+        self.transform = None
+        with self.canvas:
+            PushMatrix()
+            self.translate = Translate(0, 0)
+            self.group = InstructionGroup()
+            PopMatrix()
+        self.scan()
+
+    def scan(self):
+        available = set()
+        zooms = []
+        if os.path.isdir(self.directory):
+            with os.scandir(self.directory) as it:
+                for entry in it:
+                    parsed = parse_tile_filename(entry.name)
+                    if parsed is not None and parsed[0] == self.cache_key and entry.name.endswith(".png"):
+                        available.add(entry.name)
+                        zooms.append(parsed[1])
+        self.zooms = (min(zooms), max(zooms)) if zooms else None
+        self.available = available
+
+    def __len__(self):
+        return len(self.available)
+
+    def covers(self, zoom):
+        return self.zooms is not None and self.zooms[0] <= zoom <= self.zooms[1]
+
+    def set_active(self, active):
+        if active == self.active:
+            return
+        self.active = active
+        self.drawn = None
+        if active:
+            self.reposition()
+        else:
+            self.group.clear()
+
+    def visible_tiles(self, zoom):
+        # XYZ tile range covering the MapView, (x0, x1, y0, y1) inclusive
+        min_lat, min_lon, max_lat, max_lon = self.parent.get_bbox()
+        last = (1 << zoom) - 1
+        x0, x1 = max(lon_to_tile(min_lon, zoom), 0), min(lon_to_tile(max_lon, zoom), last)
+        y0, y1 = max(lat_to_tile(max_lat, zoom), 0), min(lat_to_tile(min_lat, zoom), last)
+        return x0, x1, y0, y1
+
+    def reposition(self):
+        mapview = self.parent
+        if not self.active or mapview is None:
+            return
+        zoom = int(mapview.zoom)
+        if not self.covers(zoom):
+            self.group.clear()
+            self.drawn = None
+            return
+
+        transform = map_transform(mapview)
+        drawn = (zoom, self.visible_tiles(zoom))
+        built = self.transform
+        if drawn == self.drawn and math.isclose(transform[0], built[0]) and math.isclose(transform[2], built[2]):
+            self.translate.xy = (transform[1] - built[1], transform[3] - built[3])
+            return
+        self.drawn = drawn
+        self.transform = transform
+        self.translate.xy = (0, 0)
+        self.build(zoom, *drawn[1])
+
+    @perf.timed("overlay.build")
+    def build(self, zoom, x0, x1, y0, y1):
+        ax, bx, ay, by = self.transform
+        n = 1 << zoom
+        self.group.clear()
+        self.group.add(Color(1, 1, 1, 1))
+        for x in range(x0, x1 + 1):
+            for y in range(y0, y1 + 1):
+                name = tile_filename(self.cache_key, zoom, x, n - 1 - y)
+                if name not in self.available:
+                    continue
+                # XYZ rows count from the north; the transform's mercator y from the south
+                pos = (ax * x / n + bx, ay * (1.0 - (y + 1) / n) + by)
+                self.group.add(Rectangle(texture=self.texture(name), pos=pos, size=(ax / n, ay / n)))
+
+    def texture(self, name):
+        texture = self.textures.get(name)
+        if texture is not None:
+            self.textures.move_to_end(name)
+            return texture
+        perf.count("overlay.load")
+        texture = CoreImage(os.path.join(self.directory, name), nocache=True).texture
+        self.textures[name] = texture
+        while len(self.textures) > self.max_textures:
+            self.textures.popitem(last=False)
+        return texture
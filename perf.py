@@ -0,0 +1,126 @@
+import functools
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+
+class Stat:
+    __slots__ = ("count", "total", "last", "max")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.last = 0.0
+        self.max = 0.0
+
+    def add(self, value):
+        self.count += 1
+        self.total += value
+        self.last = value
+        self.max = max(self.max, value)
+
+    def as_dict(self):
+        return {"count": self.count, "total": self.total, "last": self.last, "max": self.max,
+                "mean": self.total / self.count if self.count else 0.0}
+
+
+class Recorder:
+    # In-process timers and counters for the hot paths. Timings update a
+    # running Stat per name and are also kept in a bounded ring buffer of
+    # trace events, so the last few thousand can be written out as a Chrome
+    # trace (chrome://tracing, Perfetto) without the buffer ever growing.
+    def __init__(self, max_events=10000):
+        self.stats = {}  # name -> Stat of durations in seconds
+        self.counters = {}  # name -> running total
+        self.events = deque(maxlen=max_events)
+        self.lock = threading.Lock()
+        self.origin = time.perf_counter()
+        self.pid = os.getpid()
+
+    def observe(self, name, seconds, started=None, trace=True):
+        # trace=False keeps very frequent samples (e.g. frame times) out of the ring buffer
+        if started is None:
+            started = time.perf_counter() - seconds
+        with self.lock:
+            stat = self.stats.get(name)
+            if stat is None:
+                stat = self.stats[name] = Stat()
+            stat.add(seconds)
+            if trace:
+                self.events.append(("X", name, started, seconds, threading.get_ident()))
+
+    @contextmanager
+    def timer(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started, started)
+
+    def timed(self, name):
+        def decorator(fn):
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                with self.timer(name):
+                    return fn(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def count(self, name, n=1):
+        with self.lock:
+            total = self.counters[name] = self.counters.get(name, 0) + n
+            self.events.append(("C", name, time.perf_counter(), total, threading.get_ident()))
+
+    def stat(self, name):
+        with self.lock:
+            stat = self.stats.get(name)
+            return stat.as_dict() if stat is not None else None
+
+    def counter(self, name):
+        with self.lock:
+            return self.counters.get(name, 0)
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                "stats": {name: stat.as_dict() for name, stat in self.stats.items()},
+                "counters": dict(self.counters),
+            }
+
+    def trace_events(self):
+        with self.lock:
+            events = list(self.events)
+        trace = []
+        for kind, name, started, value, thread in events:
+            event = {"name": name, "cat": name.split(".")[0], "ph": kind, "pid": self.pid, "tid": thread,
+                     "ts": (started - self.origin) * 1e6}
+            if kind == "X":
+                event["dur"] = value * 1e6
+            else:
+                event["args"] = {name: value}
+            trace.append(event)
+        return trace
+
+    def export_trace(self, path):
+        # Overwrites `path` with the events currently in the ring buffer
+        partial = path + ".part"
+        with open(partial, "w") as f:
+            json.dump({"traceEvents": self.trace_events(), "displayTimeUnit": "ms",
+                       "otherData": self.snapshot()}, f)
+        os.replace(partial, path)
+
+    def reset(self):
+        with self.lock:
+            self.stats.clear()
+            self.counters.clear()
+            self.events.clear()
+
+
+recorder = Recorder()
+timer = recorder.timer
+timed = recorder.timed
+count = recorder.count
+observe = recorder.observe
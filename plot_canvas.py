@@ -0,0 +1,177 @@
+import numpy as np
+from matplotlib import dates as mdates
+from matplotlib.figure import Figure
+from kivy.garden.matplotlib.backend_kivyagg import FigureCanvasKivyAgg # type: ignore
+
+import perf
+from decimate import lttb
+
+DEFAULT_POINTS = 700  # Used until the canvas has been laid out
+ZOOM_STEP = 1.25  # Time range factor per mouse wheel step
+PINCH_MIN_DISTANCE = 20  # pixels between two touches before a pinch zooms
+
+
+class HydrographPlot:
+    # One long-lived figure, axes and Kivy canvas widget. Series are kept as
+    # Line2D artists whose data is replaced in place and the canvas is redrawn
+    # with draw_idle(); the Kivy Agg backend cannot blit, and a full draw of a
+    # few hundred points per line is cheap. Legend and layout are only redone
+    # when lines are added or removed.
+    #
+    # Lines only ever hold about one point per horizontal pixel. The full
+    # resolution series stay in memory and are re-sampled (LTTB) for whatever
+    # time range the x axis shows. The mouse wheel or a two-finger pinch
+    # zooms the time axis around the touch, a double tap shows everything.
+    def __init__(self, title, xlabel, ylabel, figsize=(7, 6)):
+        self.figure = Figure(figsize=figsize)
+        self.axes = self.figure.add_subplot()
+        self.axes.set_title(title)
+        self.axes.set_xlabel(xlabel)
+        self.axes.set_ylabel(ylabel)
+        self.labels = (title, xlabel, ylabel)
+        self.axes.grid(True)
+        self.axes.xaxis_date()
+
+        self.canvas = FigureCanvasKivyAgg(self.figure)
+        self.lines = {}  # name -> Line2D
+        self.full = {}  # name -> (x, y) full-resolution float arrays, x in matplotlib date numbers
+        self.updating = False
+        self.touches = []  # touches grabbed for a pinch, at most two
+        self.canvas.mpl_connect("draw_event", self.on_draw)
+        self.axes.callbacks.connect("xlim_changed", self.on_xlim_changed)
+        self.canvas.bind(on_touch_down=self.on_touch_down, on_touch_move=self.on_touch_move, on_touch_up=self.on_touch_up)
+
+    def set_labels(self, title, xlabel, ylabel):
+        if (title, xlabel, ylabel) == self.labels:
+            return
+        self.labels = (title, xlabel, ylabel)
+        self.axes.set_title(title)
+        self.axes.set_xlabel(xlabel)
+        self.axes.set_ylabel(ylabel)
+        self.canvas.draw_idle()
+
+    def on_draw(self, event):
+        perf.count("plot.draw")
+
+    def target_points(self):
+        # About one point per horizontal pixel of the plot
+        width = int(self.canvas.width)
+        return width if width > 100 else DEFAULT_POINTS
+
+    def sampled(self, name, xlim=None):
+        x, y = self.full[name]
+        if xlim is not None:
+            # One extra point on each side keeps the line running off the edges
+            lo = max(np.searchsorted(x, xlim[0]) - 1, 0)
+            hi = np.searchsorted(x, xlim[1]) + 1
+            x, y = x[lo:hi], y[lo:hi]
+        return lttb(x, y, self.target_points())
+
+    @perf.timed("plot.update")
+    def update(self, series):
+        # series: name -> (datetimes, values)
+        layout_changed = False
+        self.updating = True
+
+        for name in [name for name in self.lines if name not in series]:
+            self.lines.pop(name).remove()
+            del self.full[name]
+            layout_changed = True
+
+        for name, (x, y) in series.items():
+            x = np.asarray(mdates.date2num(x), dtype=np.float64)
+            y = np.asarray(y, dtype=np.float64)
+            self.full[name] = (x, y)
+            sampled_x, sampled_y = self.sampled(name)
+
+            # Markers only while every point is shown
+            marker = 'o' if len(x) <= self.target_points() else ''
+            line = self.lines.get(name)
+            if line is None:
+                (line,) = self.axes.plot(sampled_x, sampled_y, marker=marker, label=name)
+                self.lines[name] = line
+                layout_changed = True
+            else:
+                line.set_data(sampled_x, sampled_y)
+                line.set_marker(marker)
+
+        # New data is shown in full, even if the previous series was zoomed in
+        self.axes.set_autoscalex_on(True)
+        self.axes.relim()
+        self.axes.autoscale_view()
+        self.updating = False
+
+        if layout_changed:
+            legend = self.axes.get_legend()
+            if len(self.lines) > 1:
+                self.axes.legend()
+            elif legend is not None:
+                legend.remove()
+            self.figure.tight_layout()
+        self.canvas.draw_idle()
+
+    def data_range(self):
+        if not self.full:
+            return None
+        return min(x[0] for x, _ in self.full.values()), max(x[-1] for x, _ in self.full.values())
+
+    def zoom_at(self, center, factor):
+        # Scale the shown time range by factor around center, within the data
+        data_range = self.data_range()
+        if data_range is None:
+            return
+        lo, hi = self.axes.get_xlim()
+        lo, hi = center - (center - lo) * factor, center + (hi - center) * factor
+        if hi - lo >= data_range[1] - data_range[0]:
+            lo, hi = data_range
+        elif lo < data_range[0]:
+            lo, hi = data_range[0], data_range[0] + (hi - lo)
+        elif hi > data_range[1]:
+            lo, hi = data_range[1] - (hi - lo), data_range[1]
+        self.axes.set_xlim(lo, hi)
+
+    def x_at(self, widget_x):
+        # Date number under a horizontal position in the canvas widget's parent
+        return self.axes.transData.inverted().transform((widget_x - self.canvas.x, 0))[0]
+
+    def on_touch_down(self, widget, touch):
+        if not widget.collide_point(*touch.pos):
+            return False
+        if touch.is_mouse_scrolling:
+            # Same wheel direction as MapView: scrolling down zooms in
+            if touch.button in ("scrolldown", "scrollup"):
+                self.zoom_at(self.x_at(touch.x), 1 / ZOOM_STEP if touch.button == "scrolldown" else ZOOM_STEP)
+            return True
+        if touch.is_double_tap:
+            data_range = self.data_range()
+            if data_range is not None:
+                self.axes.set_xlim(*data_range)
+            return True
+        if len(self.touches) < 2:
+            touch.grab(widget)
+            self.touches.append(touch)
+        return False
+
+    def on_touch_move(self, widget, touch):
+        if touch.grab_current is not widget or len(self.touches) != 2:
+            return False
+        other = self.touches[0] if self.touches[1] is touch else self.touches[1]
+        before, after = abs(touch.px - other.x), abs(touch.x - other.x)
+        if before >= PINCH_MIN_DISTANCE and after >= PINCH_MIN_DISTANCE:
+            self.zoom_at(self.x_at((touch.x + other.x) / 2), before / after)
+        return True
+
+    def on_touch_up(self, widget, touch):
+        if touch in self.touches:
+            touch.ungrab(widget)
+            self.touches.remove(touch)
+        return False
+
+    def on_xlim_changed(self, axes):
+        if self.updating:
+            return
+        xlim = axes.get_xlim()
+        with perf.timer("plot.resample"):
+            for name, line in self.lines.items():
+                line.set_data(*self.sampled(name, xlim))
+        self.canvas.draw_idle()
@@ -0,0 +1,84 @@
+import os
+
+import numpy as np
+
+import perf
+
+EARTH_RADIUS_KM = 6371.0088
+
+
+def save_array(path, array):
+    # Written next to the target and renamed over it, so a reader never sees
+    # a partial file and arrays memory-mapped from the old file stay valid
+    partial = f"{path}.{os.getpid()}.part"
+    with open(partial, "wb") as f:
+        np.save(f, array)
+    os.replace(partial, path)
+
+
+class PointStore:
+    # StreamMidpoints as three contiguous arrays sorted by station_id:
+    # int64 station IDs and float32 coordinates (sub-metre precision), about
+    # 16 bytes per reach instead of a tuple of Python objects per row.
+    def __init__(self, station_ids, lats, lons):
+        if np.any(station_ids[1:] < station_ids[:-1]):
+            order = np.argsort(station_ids, kind="stable")
+            station_ids, lats, lons = station_ids[order], lats[order], lons[order]
+        self.station_ids = station_ids
+        self.lats = lats
+        self.lons = lons
+
+    def __len__(self):
+        return len(self.station_ids)
+
+    @classmethod
+    @perf.timed("db.load_points")
+    def from_db(cls, db):
+        # Rows go straight from the cursor into a packed record array, never into a list
+        cursor = db.connection().execute("SELECT station_id, lat, lon FROM StreamMidpoints")
+        rows = np.fromiter(cursor, dtype=[("station_id", np.int64), ("lat", np.float64), ("lon", np.float64)])
+        return cls(
+            np.ascontiguousarray(rows["station_id"]),
+            rows["lat"].astype(np.float32),
+            rows["lon"].astype(np.float32),
+        )
+
+    def save(self, directory):
+        # station_id.npy marks the cache fresh, so it is replaced last
+        os.makedirs(directory, exist_ok=True)
+        save_array(os.path.join(directory, "lat.npy"), self.lats)
+        save_array(os.path.join(directory, "lon.npy"), self.lons)
+        save_array(os.path.join(directory, "station_id.npy"), self.station_ids)
+
+    @classmethod
+    def load(cls, directory, mmap_mode="r"):
+        # Memory-mapped arrays are paged in by the OS on first touch
+        return cls(
+            np.load(os.path.join(directory, "station_id.npy"), mmap_mode=mmap_mode),
+            np.load(os.path.join(directory, "lat.npy"), mmap_mode=mmap_mode),
+            np.load(os.path.join(directory, "lon.npy"), mmap_mode=mmap_mode),
+        )
+
+    @classmethod
+    def from_cache(cls, db, directory):
+        # Reuse the .npy files generated from the database unless the database is newer
+        marker = os.path.join(directory, "station_id.npy")
+        if os.path.exists(marker) and os.path.getmtime(marker) >= os.path.getmtime(db.path):
+            try:
+                store = cls.load(directory)
+                if len(store.lats) == len(store.lons) == len(store):
+                    return store
+            except (OSError, ValueError) as error:
+                print(f"Could not read point cache {directory}: {error}")
+        store = cls.from_db(db)
+        try:
+            store.save(directory)
+        except OSError as error:
+            print(f"Could not write point cache {directory}: {error}")
+        return store
+
+    def lookup(self, station_id):
+        i = np.searchsorted(self.station_ids, station_id)
+        if i < len(self.station_ids) and self.station_ids[i] == station_id:
+            return float(self.lats[i]), float(self.lons[i])
+        return None
@@ -0,0 +1,213 @@
+"""Transpose NWM forecast cycles into a reach-major store for the app.
+
+    python reach_store.py --root s3://noaa-nwm-pds --store nwmstore
+    python reach_store.py --root /data/nwm --configuration medium_range --watch 900
+
+NWM output has one file per forecast hour holding every reach. Each ingested
+cycle is rewritten as a (stations, hours) array so one reach's hydrograph is a
+single contiguous row. Cycles already in the store are skipped, so the job
+only does work when a new cycle has been published.
+"""
+import argparse
+import json
+import os
+import shutil
+import threading
+import time
+
+import numpy as np
+
+from nwm_source import CONFIGURATIONS, NWMSource, open_channel_rt, read_streamflow, to_reference_time
+from point_store import PointStore
+from streamdb import StreamDB
+
+TRANSPOSE_ROWS = 65536  # stations copied per block when transposing
+MAX_AGE = 3 * 3600  # seconds after its reference time before a stored cycle is checked against the source
+
+
+def cycle_name(reference_time):
+    return str(to_reference_time(reference_time)).replace("-", "").replace("T", "")
+
+
+def cycle_time(name):
+    # "2024060112" -> numpy.datetime64("2024-06-01T12", "h")
+    return np.datetime64(f"{name[:4]}-{name[4:6]}-{name[6:8]}T{name[8:10]}", "h")
+
+
+class ReachStore:
+    # <directory>/<configuration>/<YYYYMMDDHH>/ holds station_id.npy (sorted),
+    # time.npy and flow.npy, a float32 (stations, hours) array read through
+    # a memory map. manifest.json lists the complete cycles; a cycle is
+    # written to a temporary directory and only listed once it is complete.
+    def __init__(self, directory="nwmstore", keep_cycles=4):
+        self.directory = directory
+        self.keep_cycles = keep_cycles
+        self.manifest_path = os.path.join(directory, "manifest.json")
+        self.opened = {}  # (configuration, cycle) -> (station_ids, times, flows)
+        self.lock = threading.Lock()
+
+    def manifest(self):
+        try:
+            with open(self.manifest_path) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+
+    def _write_manifest(self, manifest):
+        os.makedirs(self.directory, exist_ok=True)
+        partial = self.manifest_path + ".part"
+        with open(partial, "w") as f:
+            json.dump(manifest, f, indent=1)
+        os.replace(partial, self.manifest_path)
+
+    def cycles(self, configuration):
+        return self.manifest().get(configuration, [])
+
+    def path(self, configuration, cycle, name=""):
+        return os.path.join(self.directory, configuration, cycle, name)
+
+    def open(self, configuration, cycle):
+        key = (configuration, cycle)
+        with self.lock:
+            arrays = self.opened.get(key)
+        if arrays is None:
+            arrays = tuple(
+                np.load(self.path(configuration, cycle, name), mmap_mode="r")
+                for name in ("station_id.npy", "time.npy", "flow.npy")
+            )
+            with self.lock:
+                self.opened[key] = arrays
+        return arrays
+
+    def hydrograph(self, station_id, configuration="short_range", reference_time=None):
+        # (datetime64[s] times, float64 m3/s) from one row of the cycle, or
+        # None when the cycle or station is not in the store
+        cycles = self.cycles(configuration)
+        cycle = cycle_name(reference_time) if reference_time is not None else (cycles[-1] if cycles else None)
+        if cycle not in cycles:
+            return None
+        station_ids, times, flows = self.open(configuration, cycle)
+        row = np.searchsorted(station_ids, station_id)
+        if row == len(station_ids) or station_ids[row] != station_id:
+            return None
+        return np.asarray(times), np.asarray(flows[row], dtype=np.float64)
+
+    def ingest(self, source, station_ids, reference_time, configuration="short_range"):
+        # Reads each hour's national streamflow once, keeps the stations of
+        # the map, and writes them hour by hour into a time-major scratch
+        # array that is then transposed block by block into flow.npy.
+        cycle = cycle_name(reference_time)
+        reference_time = to_reference_time(reference_time)
+        station_ids = np.sort(np.asarray(station_ids, dtype=np.int64))
+        hours = list(CONFIGURATIONS[configuration][2])
+
+        partial = self.path(configuration, cycle + ".part")
+        shutil.rmtree(partial, ignore_errors=True)
+        os.makedirs(partial)
+        scratch = np.lib.format.open_memmap(
+            os.path.join(partial, "by_hour.npy"), mode="w+", dtype=np.float32, shape=(len(hours), len(station_ids))
+        )
+
+        def read(hour):
+            path = source.path(reference_time, configuration, hour)
+            with open_channel_rt(path) as dataset:
+                positions, found = source.lookup.match(dataset, station_ids)
+                flows = read_streamflow(dataset)[positions].astype(np.float32)
+            flows[~found] = np.nan
+            return flows
+
+        for i, flows in enumerate(source.executor.map(read, hours)):
+            scratch[i] = flows
+        scratch.flush()
+
+        flow = np.lib.format.open_memmap(
+            os.path.join(partial, "flow.npy"), mode="w+", dtype=np.float32, shape=(len(station_ids), len(hours))
+        )
+        for start in range(0, len(station_ids), TRANSPOSE_ROWS):
+            end = min(start + TRANSPOSE_ROWS, len(station_ids))
+            flow[start:end] = scratch[:, start:end].T
+        flow.flush()
+        del flow, scratch
+        os.remove(os.path.join(partial, "by_hour.npy"))
+
+        np.save(os.path.join(partial, "station_id.npy"), station_ids)
+        np.save(os.path.join(partial, "time.npy"), (reference_time + np.asarray(hours, dtype="timedelta64[h]")).astype("datetime64[s]"))
+
+        final = self.path(configuration, cycle)
+        shutil.rmtree(final, ignore_errors=True)
+        os.replace(partial, final)
+
+        manifest = self.manifest()
+        cycles = sorted(set(manifest.get(configuration, [])) | {cycle})
+        manifest[configuration] = cycles[-self.keep_cycles:]
+        self._write_manifest(manifest)
+        for old in cycles[:-self.keep_cycles]:
+            with self.lock:
+                self.opened.pop((configuration, old), None)
+            shutil.rmtree(self.path(configuration, old), ignore_errors=True)
+        return cycle
+
+    def update(self, source, station_ids, configuration="short_range"):
+        # Ingest the newest complete cycle unless it is already stored
+        reference_time = source.latest_cycle(configuration)
+        if reference_time is None or cycle_name(reference_time) in self.cycles(configuration):
+            return None
+        return self.ingest(source, station_ids, reference_time, configuration)
+
+
+def stored_get_streamflow(store, source, station_id, reference_time=None, configuration="short_range",
+                          max_age=MAX_AGE, now=None):
+    # Ingested cycles are one row read; anything else comes from the NetCDF
+    # files. Without a reference time the newest stored cycle is only used
+    # while it is recent or still the source's latest, so a stopped ingest
+    # job does not leave the app showing an old forecast.
+    cycles = store.cycles(configuration)
+    if reference_time is None and cycles:
+        newest = cycle_time(max(cycles))
+        now = np.datetime64(now if now is not None else "now", "s")
+        if now - newest.astype("datetime64[s]") > np.timedelta64(int(max_age), "s"):
+            latest = source.latest_cycle(configuration, now=now)
+            if latest is not None and to_reference_time(latest) > newest:
+                reference_time = latest
+
+    result = store.hydrograph(station_id, configuration, reference_time)
+    if result is not None:
+        return result
+    return source.get_streamflow(station_id, reference_time, configuration)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Ingest new NWM forecast cycles into a reach-major store.")
+    parser.add_argument("--root", required=True, help="NWM output directory or object-store URL")
+    parser.add_argument("--store", default="nwmstore")
+    parser.add_argument("--configuration", default="short_range", choices=sorted(CONFIGURATIONS))
+    parser.add_argument("--db", help="StreamMidpoints database; NWM_DB_PATH or datasample.db when omitted")
+    parser.add_argument("--point-cache", default="pointcache")
+    parser.add_argument("--keep", type=int, default=4, help="cycles kept per configuration")
+    parser.add_argument("--workers", type=int, default=8, help="forecast hours read concurrently")
+    parser.add_argument("--watch", type=float, help="check for a new cycle every this many seconds")
+    args = parser.parse_args(argv)
+
+    db = StreamDB(args.db) if args.db else StreamDB.from_env("datasample.db")
+    station_ids = PointStore.from_cache(db, args.point_cache).station_ids
+    source = NWMSource(args.root, max_workers=args.workers)
+    store = ReachStore(args.store, keep_cycles=args.keep)
+
+    try:
+        while True:
+            started = time.time()
+            cycle = store.update(source, station_ids, args.configuration)
+            if cycle is None:
+                print(f"No new {args.configuration} cycle")
+            else:
+                print(f"Ingested {args.configuration} {cycle} for {len(station_ids)} reaches in {time.time() - started:.1f}s")
+            if not args.watch:
+                return 0
+            time.sleep(args.watch)
+    finally:
+        source.shutdown()
+        db.close()
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
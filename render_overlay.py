@@ -0,0 +1,174 @@
+"""Render StreamMidpoints into transparent overlay tiles for low zoom levels.
+
+    python render_overlay.py
+    python render_overlay.py --zoom 5 10 --workers 8
+    python render_overlay.py --bbox 40.0 -111.9 40.5 -111.4 --zoom 5 10 --all
+
+Tiles use the same {cache_key}_{z}_{x}_{y}.png layout (TMS rows) as the map
+tile cache, in a separate directory so the tile cache quota never evicts
+them. Only tiles that contain a reach are written; the app treats a missing
+tile inside the rendered zoom range as empty. Tiles of the rendered zoom
+levels left over from an earlier run are removed first, and a JSON manifest
+of the run is written next to the tiles.
+"""
+import argparse
+import json
+import os
+import time
+from multiprocessing import Pool
+
+import numpy as np
+
+from clustering import lat_to_y, lon_to_x
+from lod import load_orders, min_order_for_zoom
+from point_store import PointStore
+from streamdb import StreamDB
+from tile_cache import parse_tile_filename, tile_filename
+
+TILE_SIZE = 256
+COLOR = (31, 119, 180, 230)  # RGBA of a reach dot
+
+
+def disc(radius):
+    # Pixel offsets covered by a dot of this radius
+    r = int(np.ceil(radius))
+    dy, dx = np.mgrid[-r:r + 1, -r:r + 1]
+    inside = dx ** 2 + dy ** 2 <= radius ** 2
+    return dx[inside], dy[inside]
+
+
+def group_by_tile(mx, my, zoom, radius):
+    # (x, y) XYZ tile -> pixel positions of the dots drawn on it. A dot near
+    # a tile edge is also drawn on the neighbouring tile it spills onto.
+    px = mx * (TILE_SIZE << zoom)
+    py = my * (TILE_SIZE << zoom)
+    last = (1 << zoom) - 1
+    keys, points = [], []
+    for ox in (-radius, radius):
+        for oy in (-radius, radius):
+            tx = np.clip(((px + ox) // TILE_SIZE).astype(np.int64), 0, last)
+            ty = np.clip(((py + oy) // TILE_SIZE).astype(np.int64), 0, last)
+            keys.append(tx << 32 | ty)
+            points.append(np.arange(len(px)))
+    keys, points = np.concatenate(keys), np.concatenate(points)
+    pairs = np.unique(np.column_stack((keys, points)), axis=0)
+
+    tiles = {}
+    boundaries = np.flatnonzero(np.diff(pairs[:, 0])) + 1
+    for group in np.split(pairs, boundaries):
+        key = int(group[0, 0])
+        tx, ty = key >> 32, key & 0xFFFFFFFF
+        selected = group[:, 1]
+        tiles[tx, ty] = (px[selected] - tx * TILE_SIZE, py[selected] - ty * TILE_SIZE)
+    return tiles
+
+
+def render_tile(job):
+    # Runs in a worker process; returns the file name and its size in bytes
+    from matplotlib.image import imsave
+
+    directory, cache_key, zoom, tx, ty, px, py, radius = job
+    image = np.zeros((TILE_SIZE, TILE_SIZE, 4), dtype=np.uint8)
+    dx, dy = disc(radius)
+    cols = (np.floor(px).astype(np.int64)[:, None] + dx).ravel()
+    rows = (np.floor(py).astype(np.int64)[:, None] + dy).ravel()
+    inside = (cols >= 0) & (cols < TILE_SIZE) & (rows >= 0) & (rows < TILE_SIZE)
+    image[rows[inside], cols[inside]] = COLOR
+
+    name = tile_filename(cache_key, zoom, tx, (1 << zoom) - 1 - ty)
+    path = os.path.join(directory, name)
+    partial = f"{path}.part"
+    imsave(partial, image, format="png")
+    os.replace(partial, path)
+    return name, os.path.getsize(path)
+
+
+def remove_tiles(directory, cache_key, zooms):
+    removed = 0
+    if not os.path.isdir(directory):
+        return removed
+    with os.scandir(directory) as it:
+        for entry in it:
+            parsed = parse_tile_filename(entry.name)
+            if parsed is not None and parsed[0] == cache_key and parsed[1] in zooms:
+                os.remove(entry.path)
+                removed += 1
+    return removed
+
+
+def jobs_for(store, orders, bbox, min_zoom, max_zoom, directory, cache_key, radius, draw_all):
+    lats = np.asarray(store.lats, dtype=np.float64)
+    lons = np.asarray(store.lons, dtype=np.float64)
+    keep = np.ones(len(store), dtype=bool)
+    if bbox is not None:
+        min_lat, min_lon, max_lat, max_lon = bbox
+        keep = (lats >= min_lat) & (lats <= max_lat) & (lons >= min_lon) & (lons <= max_lon)
+
+    for zoom in range(min_zoom, max_zoom + 1):
+        # Same level of detail the station layer uses, unless every reach is drawn
+        selected = keep if draw_all else keep & (orders >= min_order_for_zoom(zoom))
+        mx = lon_to_x(lons[selected])
+        my = lat_to_y(lats[selected])
+        for (tx, ty), (px, py) in group_by_tile(mx, my, zoom, radius).items():
+            yield directory, cache_key, zoom, tx, ty, px, py, radius
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Render stream reaches into overlay tiles for low zoom levels.")
+    parser.add_argument("--db", help="StreamMidpoints database; NWM_DB_PATH or datasample.db when omitted")
+    parser.add_argument("--point-cache", default="pointcache", help="directory of the .npy point arrays")
+    parser.add_argument("--bbox", nargs=4, type=float, metavar=("MIN_LAT", "MIN_LON", "MAX_LAT", "MAX_LON"),
+                        help="only render reaches inside this box")
+    parser.add_argument("--zoom", nargs=2, type=int, default=[5, 10], metavar=("MIN_ZOOM", "MAX_ZOOM"))
+    parser.add_argument("--cache-key", default="nwm-streams", help="file name prefix of the overlay tiles")
+    parser.add_argument("--directory", default="overlay")
+    parser.add_argument("--radius", type=float, default=1.5, help="dot radius in pixels")
+    parser.add_argument("--all", action="store_true", help="draw every reach instead of thinning by stream order")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="render processes")
+    args = parser.parse_args(argv)
+
+    db = StreamDB(args.db) if args.db else StreamDB.from_env("datasample.db")
+    store = PointStore.from_cache(db, args.point_cache)
+    orders = load_orders(db, store, args.point_cache)
+    min_zoom, max_zoom = args.zoom
+
+    os.makedirs(args.directory, exist_ok=True)
+    removed = remove_tiles(args.directory, args.cache_key, set(range(min_zoom, max_zoom + 1)))
+    print(f"Rendering {len(store)} reaches at zoom {min_zoom}-{max_zoom} into {args.directory} ({removed} old tiles removed)")
+
+    started = time.time()
+    counts = {}
+    total_bytes = 0
+    jobs = jobs_for(store, orders, args.bbox, min_zoom, max_zoom, args.directory, args.cache_key, args.radius, args.all)
+    with Pool(args.workers) as pool:
+        for name, size in pool.imap_unordered(render_tile, jobs, chunksize=16):
+            zoom = parse_tile_filename(name)[1]
+            counts[zoom] = counts.get(zoom, 0) + 1
+            total_bytes += size
+    db.close()
+
+    manifest_path = os.path.join(args.directory, f"{args.cache_key}.manifest.json")
+    with open(manifest_path, "w") as f:
+        json.dump(
+            {
+                "cache_key": args.cache_key,
+                "db": db.path,
+                "bbox": args.bbox,
+                "zoom": args.zoom,
+                "all": args.all,
+                "radius": args.radius,
+                "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "seconds": round(time.time() - started, 2),
+                "tiles": {str(zoom): counts[zoom] for zoom in sorted(counts)},
+                "bytes": total_bytes,
+            },
+            f,
+            indent=1,
+        )
+
+    print(f"{sum(counts.values())} tiles, {total_bytes / 1e6:.1f} MB; manifest written to {manifest_path}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,157 @@
+"""Pre-seed the map tile cache for a region so the app can run offline.
+
+    python seed_tiles.py --bbox 40.0 -111.9 40.5 -111.4 --zoom 8 14
+    python seed_tiles.py --bbox 40.0 -111.9 40.5 -111.4 --zoom 8 14 --provider osm-de
+
+Tiles already in the cache are skipped, so an interrupted run can simply be
+started again. A JSON manifest of the seeded tile set is written next to the
+tiles; the app's tile cache index reads it and never evicts the tiles it
+lists, whatever their age or the provider's quota.
+"""
+import argparse
+import json
+import math
+import os
+import random
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from tile_cache import tile_filename
+
+USER_AGENT = "nwmApp tile seeder"
+
+
+def lon_to_tile(lon, zoom):
+    return int((lon + 180.0) / 360.0 * (1 << zoom))
+
+
+def lat_to_tile(lat, zoom):
+    lat = min(max(lat, -85.0511), 85.0511)
+    rad = math.radians(lat)
+    return int((1.0 - math.asinh(math.tan(rad)) / math.pi) / 2.0 * (1 << zoom))
+
+
+def tiles_for_bbox(min_lat, min_lon, max_lat, max_lon, min_zoom, max_zoom):
+    # Yields (zoom, x, y) in XYZ row order, the order tile servers expect
+    for zoom in range(min_zoom, max_zoom + 1):
+        last = (1 << zoom) - 1
+        x0, x1 = lon_to_tile(min_lon, zoom), min(lon_to_tile(max_lon, zoom), last)
+        y0, y1 = lat_to_tile(max_lat, zoom), min(lat_to_tile(min_lat, zoom), last)
+        for x in range(x0, x1 + 1):
+            for y in range(y0, y1 + 1):
+                yield zoom, x, y
+
+
+def resolve_provider(provider):
+    # Use MapView's own source definition so file names match what the app looks up
+    from kivy_garden.mapview import MapSource
+
+    source = MapSource.from_provider(provider) if provider else MapSource()
+    return source.url, source.cache_key, list(source.subdomains), source.image_ext
+
+
+def download(url, path, retries, timeout):
+    request = urllib.request.Request(url, headers={"User-Agent": USER_AGENT})
+    for attempt in range(retries + 1):
+        try:
+            with urllib.request.urlopen(request, timeout=timeout) as response:
+                data = response.read()
+            # Write next to the target and rename so a partial file is never cached
+            tmp = f"{path}.part"
+            with open(tmp, "wb") as f:
+                f.write(data)
+            os.replace(tmp, path)
+            return len(data)
+        except OSError:
+            if attempt == retries:
+                raise
+            time.sleep(2 ** attempt + random.random())
+
+
+def seed(url, cache_key, tiles, cache_dir="cache", subdomains=("a", "b", "c"), image_ext="png",
+         workers=4, retries=3, timeout=20):
+    os.makedirs(cache_dir, exist_ok=True)
+    results = []
+    jobs = {}
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for zoom, x, y in tiles:
+            name = tile_filename(cache_key, zoom, x, (1 << zoom) - 1 - y, image_ext)
+            path = os.path.join(cache_dir, name)
+            if os.path.exists(path):
+                results.append({"z": zoom, "x": x, "y": y, "file": name, "status": "cached", "bytes": os.path.getsize(path)})
+                continue
+            tile_url = url.format(z=zoom, x=x, y=y, s=random.choice(subdomains))
+            future = executor.submit(download, tile_url, path, retries, timeout)
+            jobs[future] = {"z": zoom, "x": x, "y": y, "file": name}
+
+        for future in as_completed(jobs):
+            entry = jobs[future]
+            try:
+                entry.update(status="downloaded", bytes=future.result())
+            except OSError as error:
+                entry.update(status="failed", error=str(error))
+            results.append(entry)
+
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Download map tiles for a region into the tile cache.")
+    parser.add_argument("--bbox", nargs=4, type=float, required=True, metavar=("MIN_LAT", "MIN_LON", "MAX_LAT", "MAX_LON"))
+    parser.add_argument("--zoom", nargs=2, type=int, required=True, metavar=("MIN_ZOOM", "MAX_ZOOM"))
+    parser.add_argument("--provider", help="MapView provider key; the default MapView source when omitted")
+    parser.add_argument("--url", help="tile URL template, e.g. http://localhost:8000/{z}/{x}/{y}.png")
+    parser.add_argument("--cache-key", help="file name prefix for --url tiles")
+    parser.add_argument("--cache-dir", default="cache")
+    parser.add_argument("--workers", type=int, default=4, help="concurrent downloads")
+    parser.add_argument("--retries", type=int, default=3)
+    parser.add_argument("--max-tiles", type=int, default=50000, help="refuse to seed more tiles than this")
+    parser.add_argument("--manifest", help="manifest path; defaults to <cache-dir>/<cache-key>.manifest.json, "
+                        "only manifests in the cache directory keep their tiles from being evicted")
+    args = parser.parse_args(argv)
+
+    if args.url:
+        if not args.cache_key:
+            parser.error("--cache-key is required with --url")
+        url, cache_key, subdomains, image_ext = args.url, args.cache_key, ["a", "b", "c"], "png"
+    else:
+        url, cache_key, subdomains, image_ext = resolve_provider(args.provider)
+
+    tiles = list(tiles_for_bbox(*args.bbox, *args.zoom))
+    if len(tiles) > args.max_tiles:
+        parser.error(f"{len(tiles)} tiles requested, more than --max-tiles {args.max_tiles}")
+
+    print(f"Seeding {len(tiles)} tiles for {cache_key} into {args.cache_dir}")
+    started = time.time()
+    results = seed(url, cache_key, tiles, args.cache_dir, subdomains, image_ext, args.workers, args.retries)
+
+    counts = {}
+    for entry in results:
+        counts[entry["status"]] = counts.get(entry["status"], 0) + 1
+
+    manifest_path = args.manifest or os.path.join(args.cache_dir, f"{cache_key}.manifest.json")
+    with open(manifest_path, "w") as f:
+        json.dump(
+            {
+                "cache_key": cache_key,
+                "url": url,
+                "bbox": args.bbox,
+                "zoom": args.zoom,
+                "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "seconds": round(time.time() - started, 2),
+                "counts": counts,
+                "bytes": sum(entry.get("bytes", 0) for entry in results),
+                "tiles": sorted(results, key=lambda entry: (entry["z"], entry["x"], entry["y"])),
+            },
+            f,
+            indent=1,
+        )
+
+    print(f"{counts}; manifest written to {manifest_path}")
+    return 1 if counts.get("failed") else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
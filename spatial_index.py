@@ -0,0 +1,102 @@
+import numpy as np
+
+
+class GridIndex:
+    # Packed uniform grid over (lat, lon) arrays. Points are sorted by cell
+    # once at startup so every cell is a contiguous slice of the packed
+    # arrays and a viewport query only masks the cells it overlaps.
+    def __init__(self, station_ids, lats, lons, cell_size=0.1, ranks=None):
+        self.cell_size = cell_size
+
+        rows = np.floor(np.asarray(lats, dtype=np.float64) / cell_size).astype(np.int64)
+        cols = np.floor(np.asarray(lons, dtype=np.float64) / cell_size).astype(np.int64)
+        order = np.lexsort((cols, rows))
+
+        self.station_ids = np.asarray(station_ids)[order]
+        self.lats = np.asarray(lats)[order]
+        self.lons = np.asarray(lons)[order]
+        self.ranks = np.asarray(ranks)[order] if ranks is not None else None  # e.g. stream order per point
+
+        # cell -> (start, end) slice into the packed arrays
+        rows, cols = rows[order], cols[order]
+        boundaries = np.flatnonzero((np.diff(rows) != 0) | (np.diff(cols) != 0)) + 1
+        starts = np.concatenate(([0], boundaries)) if len(order) else np.empty(0, np.int64)
+        ends = np.append(starts[1:], len(order))
+        self.cells = {
+            (row, col): (start, end)
+            for row, col, start, end in zip(rows[starts].tolist(), cols[starts].tolist(), starts.tolist(), ends.tolist())
+        }
+
+    def __len__(self):
+        return len(self.station_ids)
+
+    def _cell(self, lat, lon):
+        return (int(np.floor(lat / self.cell_size)), int(np.floor(lon / self.cell_size)))
+
+    def query_indices(self, min_lat, min_lon, max_lat, max_lon, limit=None, min_rank=None):
+        # Positions in the packed arrays of the points inside the bbox, optionally
+        # only those ranked at least min_rank. With a limit, the points nearest
+        # the bbox center are kept so a truncated result still covers the view.
+        if not self.cells:
+            return np.empty(0, np.int64)
+
+        min_row, min_col = self._cell(min_lat, min_lon)
+        max_row, max_col = self._cell(max_lat, max_lon)
+
+        # Very large viewports cover more cells than are populated
+        if (max_row - min_row + 1) * (max_col - min_col + 1) > len(self.cells):
+            candidates = [cell for cell in self.cells if min_row <= cell[0] <= max_row and min_col <= cell[1] <= max_col]
+        else:
+            candidates = [(row, col) for row in range(min_row, max_row + 1) for col in range(min_col, max_col + 1)]
+
+        center_lat, center_lon = (min_lat + max_lat) / 2, (min_lon + max_lon) / 2
+        reach = None
+        if limit is not None:
+            if limit <= 0:
+                return np.empty(0, np.int64)
+            # Cells are visited by how close their nearest edge is to the
+            # center. Once limit points are found, a cell that cannot hold
+            # anything nearer than the limit-th of them ends the search.
+            edges = np.array(candidates, dtype=np.float64).reshape(-1, 2) * self.cell_size
+            dlat = np.maximum(np.maximum(edges[:, 0] - center_lat, center_lat - edges[:, 0] - self.cell_size), 0.0)
+            dlon = np.maximum(np.maximum(edges[:, 1] - center_lon, center_lon - edges[:, 1] - self.cell_size), 0.0)
+            reach = dlat ** 2 + dlon ** 2
+            order = np.argsort(reach, kind="stable")
+            candidates = [candidates[i] for i in order.tolist()]
+            reach = reach[order].tolist()
+
+        found = []
+        total = 0
+        cutoff = np.inf
+        for i, cell in enumerate(candidates):
+            span = self.cells.get(cell)
+            if span is None:
+                continue
+            if reach is not None and reach[i] > cutoff:
+                break
+            start, end = span
+            lats, lons = self.lats[start:end], self.lons[start:end]
+            mask = (lats >= min_lat) & (lats <= max_lat) & (lons >= min_lon) & (lons <= max_lon)
+            if min_rank is not None and self.ranks is not None:
+                mask &= self.ranks[start:end] >= min_rank
+            indices = np.flatnonzero(mask) + start
+            found.append(indices)
+            total += len(indices)
+            if limit is not None and total >= limit and cutoff == np.inf:
+                # Later cells only lower the true cutoff, so this one stays safe
+                cutoff = np.partition(self._distance2(np.concatenate(found), center_lat, center_lon), limit - 1)[limit - 1]
+
+        if not found:
+            return np.empty(0, np.int64)
+        found = np.concatenate(found)
+        if limit is not None and len(found) > limit:
+            distance = self._distance2(found, center_lat, center_lon)
+            found = found[np.argsort(distance, kind="stable")[:limit]]
+        return found
+
+    def _distance2(self, indices, lat, lon):
+        return (self.lats[indices] - lat) ** 2 + (self.lons[indices] - lon) ** 2
+
+    def query_bbox(self, min_lat, min_lon, max_lat, max_lon, limit=None, min_rank=None):
+        indices = self.query_indices(min_lat, min_lon, max_lat, max_lon, limit=limit, min_rank=min_rank)
+        return list(zip(self.station_ids[indices].tolist(), self.lats[indices].tolist(), self.lons[indices].tolist()))
@@ -0,0 +1,52 @@
+import json
+import os
+import sys
+import time
+
+
+class StartupTimer:
+    # Milestones of one app launch in seconds since `started`, a
+    # time.perf_counter() value taken before the app's heavy imports. Each
+    # milestone keeps the first time it was reached. report() prints them
+    # and appends one JSON line per launch to `log_path` so launches can be
+    # compared over time.
+    def __init__(self, started, log_path="startup_times.jsonl"):
+        self.started = started
+        self.log_path = log_path
+        self.marks = {}
+        self.reported = False
+
+    def mark(self, name):
+        if name not in self.marks:
+            self.marks[name] = time.perf_counter() - self.started
+        return self.marks[name]
+
+    def mark_next_frame(self, name, callback=None):
+        # Marks when the next frame reaches the screen
+        from kivy.core.window import Window
+
+        def on_flip(*args):
+            Window.unbind(on_flip=on_flip)
+            self.mark(name)
+            if callback is not None:
+                callback()
+
+        Window.bind(on_flip=on_flip)
+
+    def report(self):
+        if self.reported:
+            return
+        self.reported = True
+        print("Startup: " + ", ".join(f"{name} {seconds:.3f}s" for name, seconds in self.marks.items()))
+        if not self.log_path:
+            return
+        entry = {
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "script": os.path.basename(sys.argv[0]),
+            **{name: round(seconds, 4) for name, seconds in self.marks.items()},
+        }
+        try:
+            with open(self.log_path, "a") as f:
+                f.write(json.dumps(entry) + "\n")
+        except OSError as error:
+            print(f"Could not write startup log {self.log_path}: {error}")
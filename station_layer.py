@@ -0,0 +1,140 @@
+import math
+
+import numpy as np
+from kivy.core.image import Image as CoreImage
+from kivy.graphics import Color, InstructionGroup, Mesh, PopMatrix, PushMatrix, Translate
+from kivy_garden.mapview import MapLayer
+
+import perf
+from clustering import lat_to_y, lon_to_x, x_to_lon, y_to_lat
+from spatial_index import GridIndex
+
+MAX_QUADS = 16383  # Mesh indices are 16 bit, four vertices per quad
+REFERENCE_LAT = 45.0  # Second point used to recover the map transform
+
+
+def map_transform(mapview):
+    # Window x = ax * mercator x + bx (same for y, mercator y running south
+    # to north), recovered from two points projected by the MapView so it
+    # always matches the markers
+    if mapview is None:
+        return None
+    zoom = mapview.zoom
+    x0, y0 = mapview.get_window_xy_from(0.0, 0.0, zoom)
+    x1, y1 = mapview.get_window_xy_from(REFERENCE_LAT, 90.0, zoom)
+    ax = (x1 - x0) / 0.25
+    ay = (y1 - y0) / (0.5 - float(lat_to_y(REFERENCE_LAT)))
+    return ax, x0 - ax * 0.5, ay, y0 - ay * 0.5
+
+
+class StationLayer(MapLayer):
+    # Draws every station as a textured quad in a few Mesh instructions that
+    # share one texture, instead of one MapMarker widget per station.
+    # Vertices are built in window coordinates for the current zoom; a pan
+    # only moves a Translate instruction, and the quads are rebuilt when the
+    # zoom (or scale) changes. Touches are resolved through a GridIndex over
+    # the drawn stations instead of per-widget collision checks.
+    def __init__(self, on_press, source="icon2.png", marker_size=32, **kwargs):
+        super().__init__(**kwargs)
+        self.on_press = on_press  # callback(station_id)
+        self.texture = CoreImage(source).texture
+        self.marker_size = marker_size
+        self.station_ids = np.empty(0, np.int64)
+        self.mx = np.empty(0)  # normalized mercator x, 0..1 west to east
+        self.my = np.empty(0)  # normalized mercator y, 0..1 south to north
+        self.index = None
+        self.transform = None  # (ax, bx, ay, by) the vertices were built with
+        with self.canvas:
+            PushMatrix()
+            self.translate = Translate(0, 0)
+            self.group = InstructionGroup()
+            PopMatrix()
+
+    def __len__(self):
+        return len(self.station_ids)
+
+    def set_points(self, station_ids, lats, lons, marker_size=None):
+        self.station_ids = np.asarray(station_ids, dtype=np.int64)
+        self.mx = lon_to_x(lons)
+        self.my = 1.0 - lat_to_y(lats)
+        self.index = GridIndex(np.arange(len(self.station_ids)), lats, lons, cell_size=0.05)
+        if marker_size is not None:
+            self.marker_size = marker_size
+        self.transform = None
+        self.reposition()
+
+    def map_transform(self):
+        return map_transform(self.parent)
+
+    def reposition(self):
+        transform = self.map_transform()
+        if transform is None:
+            return
+        built = self.transform
+        if built is not None and math.isclose(transform[0], built[0]) and math.isclose(transform[2], built[2]):
+            self.translate.xy = (transform[1] - built[1], transform[3] - built[3])
+            return
+        self.transform = transform
+        self.translate.xy = (0, 0)
+        self.build(transform)
+
+    @perf.timed("stations.build")
+    def build(self, transform):
+        ax, bx, ay, by = transform
+        x = ax * self.mx + bx
+        y = ay * self.my + by
+        half = self.marker_size / 2.0
+
+        # Icons are anchored at their bottom center like MapMarker
+        corners = np.array([[-half, 0], [half, 0], [half, self.marker_size], [-half, self.marker_size]])
+        uv = np.asarray(self.texture.tex_coords, dtype=np.float64).reshape(4, 2)
+        vertices = np.empty((len(x), 4, 4), dtype=np.float64)
+        vertices[:, :, 0] = x[:, None] + corners[:, 0]
+        vertices[:, :, 1] = y[:, None] + corners[:, 1]
+        vertices[:, :, 2:] = uv
+
+        self.group.clear()
+        self.group.add(Color(1, 1, 1, 1))
+        quad = np.array([0, 1, 2, 2, 3, 0])
+        for start in range(0, len(x), MAX_QUADS):
+            chunk = vertices[start:start + MAX_QUADS]
+            indices = (np.arange(len(chunk))[:, None] * 4 + quad).ravel()
+            self.group.add(Mesh(vertices=chunk.ravel().tolist(), indices=indices.tolist(), mode="triangles", texture=self.texture))
+
+    def unload(self):
+        self.set_points(np.empty(0, np.int64), np.empty(0), np.empty(0))
+
+    def station_at(self, x, y):
+        # Nearest icon under a window position, or None
+        if self.transform is None or not len(self.station_ids):
+            return None
+        ax, bx, ay, by = self.transform
+        dx, dy = self.translate.xy
+        bx, by = bx + dx, by + dy
+
+        # An icon covers [x - size/2, x + size/2] x [y, y + size] above its station
+        half = self.marker_size / 2.0
+        west, east = x_to_lon((x - half - bx) / ax), x_to_lon((x + half - bx) / ax)
+        south = y_to_lat(1.0 - (y - self.marker_size - by) / ay)
+        north = y_to_lat(1.0 - (y - by) / ay)
+        found = self.index.query_indices(min(south, north), min(west, east), max(south, north), max(west, east))
+        if not len(found):
+            return None
+
+        points = self.index.station_ids[found]
+        center_x = ax * self.mx[points] + bx
+        center_y = ay * self.my[points] + by + half
+        nearest = points[np.argmin((center_x - x) ** 2 + (center_y - y) ** 2)]
+        return int(self.station_ids[nearest])
+
+    def on_touch_down(self, touch):
+        mapview = self.parent
+        if mapview is None or not mapview.collide_point(*touch.pos):
+            return False
+        with perf.timer("stations.hit_test"):
+            station_id = self.station_at(*touch.pos)
+        if station_id is None:
+            return False
+        touch.ud["station_id"] = station_id  # Lets map tap handlers skip this touch
+        self.on_press(station_id)
+        return True
@@ -0,0 +1,80 @@
+import os
+import sqlite3
+import threading
+from typing import List, NamedTuple, Optional, Tuple
+from urllib.parse import quote
+
+import perf
+
+DB_PATH_ENV = "NWM_DB_PATH"  # Overrides the database path of every map variant
+
+
+class StreamPoint(NamedTuple):
+    station_id: int
+    lat: float
+    lon: float
+
+
+class StreamDB:
+    # Shared access to the StreamMidpoints database. Each thread gets one
+    # long-lived, read-only connection that is configured once, so queries
+    # skip connection setup and schema parsing and reuse a warm page cache.
+    # sqlite3 keeps the compiled form of every query text in its statement
+    # cache, so the fixed SQL below is prepared only once per connection.
+    def __init__(self, path: str, read_only: bool = True, mmap_size: int = 256 * 1024 * 1024,
+                 cache_size_kb: int = 16 * 1024, cached_statements: int = 64):
+        self.path = path
+        self.read_only = read_only
+        self.mmap_size = mmap_size
+        self.cache_size_kb = cache_size_kb
+        self.cached_statements = cached_statements
+        self.local = threading.local()
+        self.connections: List[sqlite3.Connection] = []
+        self.lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls, default_path: str, **kwargs) -> "StreamDB":
+        return cls(os.environ.get(DB_PATH_ENV, default_path), **kwargs)
+
+    def connection(self) -> sqlite3.Connection:
+        conn = getattr(self.local, "conn", None)
+        if conn is None:
+            mode = "ro" if self.read_only else "rw"
+            uri = f"file:{quote(os.path.abspath(self.path))}?mode={mode}"
+            conn = sqlite3.connect(uri, uri=True, cached_statements=self.cached_statements)
+            conn.execute(f"PRAGMA mmap_size = {int(self.mmap_size)}")
+            conn.execute(f"PRAGMA cache_size = {-int(self.cache_size_kb)}")
+            if self.read_only:
+                conn.execute("PRAGMA query_only = ON")
+            self.local.conn = conn
+            with self.lock:
+                self.connections.append(conn)
+        return conn
+
+    def all_points(self) -> List[StreamPoint]:
+        with perf.timer("db.all_points"):
+            rows = self.connection().execute("SELECT station_id, lat, lon FROM StreamMidpoints").fetchall()
+        return [StreamPoint(*row) for row in rows]
+
+    def lat_lon(self) -> Tuple[List[float], List[float]]:
+        with perf.timer("db.lat_lon"):
+            rows = self.connection().execute("SELECT lat, lon FROM StreamMidpoints").fetchall()
+        return [row[0] for row in rows], [row[1] for row in rows]
+
+    def station_at(self, lat: float, lon: float) -> Optional[int]:
+        with perf.timer("db.station_at"):
+            row = self.connection().execute(
+                "SELECT station_id FROM StreamMidpoints WHERE lat = ? AND lon = ?", (lat, lon)
+            ).fetchone()
+        return row[0] if row else None
+
+    def close(self) -> None:
+        with self.lock:
+            connections, self.connections = self.connections, []
+        for conn in connections:
+            try:
+                conn.close()
+            except sqlite3.ProgrammingError:
+                # Connections can only be closed from their own thread
+                pass
+        self.local = threading.local()
@@ -0,0 +1,37 @@
+import numpy as np
+import pytest
+
+from decimate import lttb
+
+
+def test_short_series_are_returned_unchanged():
+    x, y = np.arange(10.0), np.arange(10.0)
+    out_x, out_y = lttb(x, y, 10)
+    assert out_x is x and out_y is y
+
+
+def test_keeps_the_ends_and_the_threshold():
+    x = np.arange(10_000, dtype=np.float64)
+    y = np.sin(x / 100.0)
+    out_x, out_y = lttb(x, y, 500)
+    assert len(out_x) == len(out_y) == 500
+    assert out_x[0] == x[0] and out_x[-1] == x[-1]
+    assert np.all(np.diff(out_x) > 0)
+    assert np.array_equal(out_y, y[out_x.astype(np.int64)])
+
+
+def test_keeps_peaks():
+    x = np.arange(5000, dtype=np.float64)
+    y = np.zeros(5000)
+    y[1234] = 100.0
+    y[4321] = -50.0
+    out_x, _ = lttb(x, y, 100)
+    assert 1234 in out_x and 4321 in out_x
+
+
+@pytest.mark.filterwarnings("ignore:Mean of empty slice")
+def test_all_nan_buckets():
+    y = np.full(1000, np.nan)
+    y[::100] = 1.0
+    out_x, _ = lttb(np.arange(1000, dtype=np.float64), y, 50)
+    assert len(out_x) == 50
@@ -0,0 +1,121 @@
+import threading
+import time
+
+from forecast_fetch import ForecastFetcher
+
+URL = "http://example.org/cuahsi_1_1.asmx?WSDL"
+
+
+def make_fetcher(**kwargs):
+    # Callbacks run on the worker thread instead of the Kivy clock
+    return ForecastFetcher(dispatch=lambda callback: callback(), rate=1000.0, **kwargs)
+
+
+def test_fetch_batch_delivers_every_site_then_completes():
+    fetcher = make_fetcher()
+    sites = [f"site{i}" for i in range(40)]
+    lock = threading.Lock()
+    running = {"now": 0, "max": 0}
+    results = []
+    completed = []
+    done = threading.Event()
+
+    def fn(url, site, variable, start, end):
+        with lock:
+            running["now"] += 1
+            running["max"] = max(running["max"], running["now"])
+        time.sleep(0.002)
+        with lock:
+            running["now"] -= 1
+        return site.upper()
+
+    def on_complete():
+        completed.append(len(results))
+        done.set()
+
+    fetcher.fetch_batch(fn, URL, sites, "var", "2024-01-01", "2024-01-02",
+                        on_result=lambda site, result: results.append((site, result)),
+                        on_complete=on_complete, max_concurrency=4)
+    assert done.wait(10)
+    fetcher.shutdown()
+
+    assert sorted(results) == sorted((site, site.upper()) for site in sites)
+    assert completed == [len(sites)]  # once, after every result
+    assert running["max"] <= 4
+
+
+def test_fetch_batch_reports_errors_and_still_completes():
+    fetcher = make_fetcher()
+    results, errors = [], []
+    done = threading.Event()
+
+    def fn(url, site, variable, start, end):
+        if site == "bad":
+            raise ValueError(site)
+        return site
+
+    fetcher.fetch_batch(fn, URL, ["a", "bad", "b"], "var", "2024-01-01", "2024-01-02",
+                        on_result=lambda site, result: results.append(site),
+                        on_error=lambda site, error: errors.append((site, str(error))),
+                        on_complete=done.set, retries=0)
+    assert done.wait(10)
+    fetcher.shutdown()
+
+    assert sorted(results) == ["a", "b"]
+    assert errors == [("bad", "bad")]
+
+
+def test_fetch_batch_without_sites_completes():
+    fetcher = make_fetcher()
+    completed = []
+    fetcher.fetch_batch(lambda *args: None, URL, [], "var", "2024-01-01", "2024-01-02",
+                        on_result=lambda site, result: None, on_complete=lambda: completed.append(True))
+    fetcher.shutdown()
+    assert completed == [True]
+
+
+def test_cancel_drops_results_and_stops_the_batch():
+    fetcher = make_fetcher()
+    release = threading.Event()
+    started = []
+    results = []
+    completed = []
+
+    def fn(url, site, variable, start, end):
+        started.append(site)
+        release.wait(10)
+        return site
+
+    fetcher.fetch_batch(fn, URL, [f"site{i}" for i in range(10)], "var", "2024-01-01", "2024-01-02",
+                        on_result=lambda site, result: results.append(site),
+                        on_complete=lambda: completed.append(True), max_concurrency=2)
+    while len(started) < 2:
+        time.sleep(0.001)
+    fetcher.cancel()
+    release.set()
+    fetcher.shutdown()
+
+    assert len(started) == 2  # nothing queued was started after the cancel
+    assert results == []
+    assert completed == []
+
+
+def test_prefetch_and_fetch_share_one_call_until_taken():
+    fetcher = make_fetcher()
+    calls = []
+    results = []
+
+    def fn(site):
+        calls.append(site)
+        return site
+
+    fetcher.prefetch("key", fn, "a")
+    fetcher.fetch("key", fn, "a", on_result=results.append).result(10)
+    assert calls == ["a"]
+    assert results == ["a"]
+
+    # The delivered result is not handed out again, so the next fetch reaches fn
+    fetcher.fetch("key", fn, "a", on_result=results.append).result(10)
+    fetcher.shutdown()
+    assert calls == ["a", "a"]
+    assert "key" not in fetcher.futures
@@ -0,0 +1,50 @@
+import numpy as np
+import pytest
+
+from nearest import NearestIndex
+from point_store import EARTH_RADIUS_KM
+
+
+def haversine_km(lat, lon, lats, lons):
+    lat1, lon1 = np.radians(lat), np.radians(lon)
+    lat2, lon2 = np.radians(lats), np.radians(lons)
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(a))
+
+
+@pytest.fixture(scope="module")
+def stations():
+    rng = np.random.default_rng(2)
+    n = 5000
+    ids = rng.permutation(np.arange(100_000, 100_000 + n))
+    return ids, rng.uniform(25.0, 49.0, n), rng.uniform(-124.0, -67.0, n)
+
+
+@pytest.fixture(scope="module")
+def index(stations):
+    return NearestIndex(*stations, leaf_size=16)
+
+
+@pytest.mark.parametrize("lat, lon", [(40.76, -111.89), (25.0, -124.0), (48.9, -67.1), (37.0, -95.0)])
+def test_matches_brute_force(stations, index, lat, lon):
+    ids, lats, lons = stations
+    distance = haversine_km(lat, lon, lats, lons)
+    order = np.argsort(distance)[:5]
+
+    found = index.nearest(lat, lon, k=5)
+    assert [station_id for station_id, _ in found] == ids[order].tolist()
+    assert np.allclose([km for _, km in found], distance[order], rtol=1e-6)
+
+
+def test_max_km(stations, index):
+    ids, lats, lons = stations
+    distance = haversine_km(40.0, -100.0, lats, lons)
+    expected = ids[np.argsort(distance)][:(distance <= 50.0).sum()]
+
+    found = index.nearest(40.0, -100.0, k=len(ids), max_km=50.0)
+    assert [station_id for station_id, _ in found] == expected.tolist()
+    assert index.nearest(0.0, 0.0, max_km=10.0) == []
+
+
+def test_empty_index():
+    assert NearestIndex([], [], []).nearest(40.0, -100.0) == []
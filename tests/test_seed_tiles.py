@@ -0,0 +1,63 @@
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from seed_tiles import seed, tiles_for_bbox
+from tile_cache import tile_filename
+
+
+class TileHandler(BaseHTTPRequestHandler):
+    # Serves "/z/x/y.png" as the path's bytes; tiles in `missing` are 404
+    missing = {"/2/3/3.png"}
+
+    def do_GET(self):
+        self.server.requests.append(self.path)
+        if self.path in self.missing:
+            self.send_error(404)
+            return
+        body = self.path.encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "image/png")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def tile_server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), TileHandler)
+    server.requests = []
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_tiles_for_bbox_covers_the_world_at_zoom_one():
+    tiles = list(tiles_for_bbox(-85, -180, 85, 179.9, 0, 1))
+    assert tiles == [(0, 0, 0), (1, 0, 0), (1, 0, 1), (1, 1, 0), (1, 1, 1)]
+
+
+def test_seed_downloads_then_skips_cached_tiles(tile_server, tmp_path):
+    url = f"http://127.0.0.1:{tile_server.server_port}/{{z}}/{{x}}/{{y}}.png"
+    tiles = [(2, 1, 0), (2, 1, 1), (2, 3, 3)]
+
+    results = seed(url, "test", tiles, cache_dir=str(tmp_path), retries=0, workers=2)
+    status = {(entry["z"], entry["x"], entry["y"]): entry["status"] for entry in results}
+    assert status == {(2, 1, 0): "downloaded", (2, 1, 1): "downloaded", (2, 3, 3): "failed"}
+
+    # Files use MapView's flipped (TMS) row
+    assert (tmp_path / tile_filename("test", 2, 1, 3)).read_bytes() == b"/2/1/0.png"
+    assert (tmp_path / tile_filename("test", 2, 1, 2)).read_bytes() == b"/2/1/1.png"
+    assert not (tmp_path / tile_filename("test", 2, 3, 0)).exists()
+    assert not list(tmp_path.glob("*.part"))
+
+    tile_server.requests.clear()
+    results = seed(url, "test", tiles, cache_dir=str(tmp_path), retries=0)
+    assert sorted(entry["status"] for entry in results) == ["cached", "cached", "failed"]
+    assert tile_server.requests == ["/2/3/3.png"]
@@ -0,0 +1,52 @@
+import numpy as np
+import pytest
+
+from spatial_index import GridIndex
+
+BBOX = (40.0, -112.0, 41.0, -111.0)
+
+
+@pytest.fixture(scope="module")
+def points():
+    rng = np.random.default_rng(1)
+    n = 20_000
+    lats = rng.uniform(39.0, 42.0, n)
+    lons = rng.uniform(-113.0, -110.0, n)
+    ranks = rng.integers(1, 8, n)
+    return np.arange(n), lats, lons, ranks
+
+
+def brute_force(lats, lons, min_lat, min_lon, max_lat, max_lon):
+    return (lats >= min_lat) & (lats <= max_lat) & (lons >= min_lon) & (lons <= max_lon)
+
+
+def test_query_matches_brute_force(points):
+    ids, lats, lons, ranks = points
+    index = GridIndex(ids, lats, lons, ranks=ranks)
+    found = index.query_bbox(*BBOX)
+    assert sorted(station_id for station_id, _, _ in found) == np.flatnonzero(brute_force(lats, lons, *BBOX)).tolist()
+
+
+def test_min_rank(points):
+    ids, lats, lons, ranks = points
+    index = GridIndex(ids, lats, lons, ranks=ranks)
+    found = index.query_bbox(*BBOX, min_rank=5)
+    expected = np.flatnonzero(brute_force(lats, lons, *BBOX) & (ranks >= 5))
+    assert sorted(station_id for station_id, _, _ in found) == expected.tolist()
+
+
+def test_limit_keeps_the_points_nearest_the_center(points):
+    ids, lats, lons, _ = points
+    index = GridIndex(ids, lats, lons)
+    found = index.query_bbox(*BBOX, limit=100)
+
+    inside = np.flatnonzero(brute_force(lats, lons, *BBOX))
+    distance = (lats[inside] - 40.5) ** 2 + (lons[inside] + 111.5) ** 2
+    expected = inside[np.argsort(distance)[:100]]
+    assert [station_id for station_id, _, _ in found] == expected.tolist()
+
+
+def test_empty_index_and_empty_viewport(points):
+    assert len(GridIndex([], [], []).query_indices(*BBOX)) == 0
+    ids, lats, lons, _ = points
+    assert GridIndex(ids, lats, lons).query_bbox(0.0, 0.0, 1.0, 1.0) == []
@@ -0,0 +1,74 @@
+import numpy as np
+import pytest
+
+from timeseries_cache import TimeSeriesCache, cached_get_values
+
+URL, SITE, VARIABLE = "http://example.org/cuahsi_1_1.asmx?WSDL", "NWISUV:10163000", "NWISUV:00060"
+
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = TimeSeriesCache(str(tmp_path / "cache.db"))
+    yield cache
+    cache.close()
+
+
+def series(*times):
+    return np.array(times, dtype="datetime64[s]"), np.arange(len(times), dtype=np.float64)
+
+
+def test_missing_ranges(cache):
+    assert cache.missing_ranges(URL, SITE, VARIABLE, "2024-01-05", "2024-01-15") == [("2024-01-05", "2024-01-15")]
+
+    cache.store(URL, SITE, VARIABLE, "2024-01-01", "2024-01-10", *series())
+    assert cache.missing_ranges(URL, SITE, VARIABLE, "2024-01-05", "2024-01-15") == [("2024-01-11", "2024-01-15")]
+    assert cache.missing_ranges(URL, SITE, VARIABLE, "2023-12-30", "2024-01-12") == [
+        ("2023-12-30", "2023-12-31"),
+        ("2024-01-11", "2024-01-12"),
+    ]
+    assert cache.missing_ranges(URL, SITE, VARIABLE, "2024-01-02", "2024-01-09") == []
+
+
+def test_recent_ranges_expire(tmp_path):
+    cache = TimeSeriesCache(str(tmp_path / "cache.db"), ttl=0)
+    today = str(np.datetime64("today", "D"))
+    cache.store(URL, SITE, VARIABLE, today, today, *series())
+    assert cache.missing_ranges(URL, SITE, VARIABLE, today, today) == [(today, today)]
+    cache.close()
+
+
+def test_read_uses_the_local_day_window(cache):
+    # UTC-5: local 2024-01-01 is 05:00 on Jan 1 to 05:00 on Jan 2, UTC
+    times, values = series("2024-01-01T04:00:00", "2024-01-01T05:00:00", "2024-01-02T04:00:00", "2024-01-02T05:00:00")
+    cache.store(URL, SITE, VARIABLE, "2023-12-31", "2024-01-02", times, values, utc_offset=-300)
+
+    read_times, read_values = cache.read(URL, SITE, VARIABLE, "2024-01-01", "2024-01-01")
+    assert read_times.tolist() == times[1:3].tolist()
+    assert read_values.tolist() == [1.0, 2.0]
+
+
+def test_cached_get_values_fetches_only_missing_days(cache):
+    requests = []
+
+    def fetch(url, site, variable, start, end):
+        requests.append((start, end))
+        return series(f"{start}T12:00:00") + (0,)
+
+    cached_get_values(cache, fetch, URL, SITE, VARIABLE, "2024-01-01", "2024-01-03")
+    times, _ = cached_get_values(cache, fetch, URL, SITE, VARIABLE, "2024-01-01", "2024-01-05")
+    assert requests == [("2024-01-01", "2024-01-03"), ("2024-01-04", "2024-01-05")]
+    assert times.tolist() == np.array(["2024-01-01T12:00:00", "2024-01-04T12:00:00"], dtype="datetime64[s]").tolist()
+
+
+def test_cached_get_values_falls_back_when_the_fetch_fails(cache):
+    cached_get_values(cache, lambda *args: series("2024-01-02T00:00:00") + (0,), URL, SITE, VARIABLE,
+                      "2024-01-01", "2024-01-03")
+
+    def fail(*args):
+        raise OSError("offline")
+
+    times, _ = cached_get_values(cache, fail, URL, SITE, VARIABLE, "2024-01-01", "2024-01-05")
+    assert times.tolist() == [np.datetime64("2024-01-02T00:00:00", "s").tolist()]
+
+    with pytest.raises(OSError):
+        cached_get_values(cache, fail, URL, "NWISUV:00000000", VARIABLE, "2024-01-01", "2024-01-05")
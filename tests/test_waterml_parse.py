@@ -0,0 +1,66 @@
+import numpy as np
+
+from waterml_parse import parse_offsets, parse_values, utc_offset
+
+
+def test_parse_offsets():
+    offsets = ["-05:00", "+0530", "-5", "7", "Z", "", None, "+5:30", "bogus", "-07:00:00"]
+    minutes = parse_offsets(offsets)
+    assert minutes[:8].astype(np.int64).tolist() == [-300, 330, -300, 420, 0, 0, 0, 330]
+    assert np.isnat(minutes[8]) and np.isnat(minutes[9])
+
+
+def test_parse_values_prefers_utc_times():
+    values = [
+        {"dateTime": "2024-01-01T00:00:00", "dateTimeUTC": "2024-01-01T05:00:00", "timeOffset": "-05:00", "dataValue": "1.5"},
+        {"dateTime": "2024-01-01T01:00:00", "dateTimeUTC": "2024-01-01T06:00:00", "timeOffset": "-05:00", "dataValue": "2"},
+    ]
+    times, data = parse_values(values)
+    assert times.tolist() == np.array(["2024-01-01T05:00:00", "2024-01-01T06:00:00"], dtype="datetime64[s]").tolist()
+    assert data.tolist() == [1.5, 2.0]
+
+
+def test_parse_values_shifts_local_times_by_offset():
+    values = [
+        {"dateTime": "2024-01-01T00:00:00", "timeOffset": "-05:00", "dataValue": "1"},
+        {"dateTime": "2024-01-01T00:00:00", "timeOffset": "Z", "dataValue": "2"},
+    ]
+    times, data = parse_values(values)
+    # Sorted by UTC time: the "Z" record comes first
+    assert times.tolist() == np.array(["2024-01-01T00:00:00", "2024-01-01T05:00:00"], dtype="datetime64[s]").tolist()
+    assert data.tolist() == [2.0, 1.0]
+
+
+def test_parse_values_falls_back_on_unparseable_offsets():
+    # Without dateTimeUTC on the first record, times come from dateTime and timeOffset
+    values = [
+        {"dateTime": "2024-01-01T00:00:00", "timeOffset": "??", "dataValue": "1"},
+        {"dateTime": "2024-01-01T01:00:00", "timeOffset": "??", "dateTimeUTC": "2024-01-01T06:00:00", "dataValue": "2"},
+    ]
+    times, data = parse_values(values)
+    assert np.isnat(times[0])
+    assert times[1] == np.datetime64("2024-01-01T06:00:00")
+    assert data.tolist() == [1.0, 2.0]
+
+
+def test_parse_values_no_data_and_bad_values_are_nan():
+    values = [
+        {"dateTimeUTC": "2024-01-01T00:00:00", "dataValue": "-9999"},
+        {"dateTimeUTC": "2024-01-01T01:00:00", "dataValue": "n/a"},
+        {"dateTimeUTC": "2024-01-01T02:00:00", "dataValue": "3"},
+    ]
+    _, data = parse_values(values)
+    assert np.isnan(data[0]) and np.isnan(data[1]) and data[2] == 3.0
+
+
+def test_parse_values_empty():
+    times, data = parse_values([])
+    assert len(times) == 0 and len(data) == 0
+
+
+def test_utc_offset():
+    assert utc_offset([]) is None
+    assert utc_offset([{"timeOffset": "-07:00"}]) == -420
+    assert utc_offset([{"timeOffset": "Z"}]) == 0
+    assert utc_offset([{"dateTime": "2024-01-01T00:00:00", "dateTimeUTC": "2024-01-01T05:00:00"}]) == -300
+    assert utc_offset([{"timeOffset": "??", "dateTime": "2024-01-01T00:00:00", "dateTimeUTC": "2024-01-01T05:00:00"}]) == -300
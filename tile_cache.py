@@ -0,0 +1,151 @@
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+DEFAULT_QUOTA = 32 * 1024 * 1024  # bytes per provider
+
+
+def tile_filename(cache_key, zoom, tile_x, tile_y, image_ext="png"):
+    # Same layout MapView uses for its cache directory. MapView counts tile
+    # rows from the bottom (TMS), so tile_y here is the flipped XYZ row.
+    return f"{cache_key}_{zoom}_{tile_x}_{tile_y}.{image_ext}"
+
+
+def parse_tile_filename(name):
+    # "thunderforest-cycle_12_766_1548.png" -> ("thunderforest-cycle", 12, 766, 1548)
+    stem, _, _ = name.rpartition(".")
+    parts = stem.rsplit("_", 3)
+    if len(parts) != 4:
+        return None
+    try:
+        return parts[0], int(parts[1]), int(parts[2]), int(parts[3])
+    except ValueError:
+        return None
+
+
+class TileCacheIndex:
+    # In-memory index of the flat tile cache directory. The directory is
+    # scanned once; after that lookups are dictionary hits and each provider
+    # keeps its tiles in least-recently-used order for eviction. Tiles listed
+    # in a seed_tiles.py manifest in the directory are pinned: they count
+    # towards no quota and are never evicted, so a seeded region stays
+    # available offline.
+    def __init__(self, cache_dir="cache", quotas=None, default_quota=DEFAULT_QUOTA, max_age=None):
+        self.cache_dir = cache_dir
+        self.quotas = quotas or {}
+        self.default_quota = default_quota
+        self.max_age = max_age  # seconds; tiles older than this are evicted regardless of quota
+        self.providers = {}  # cache_key -> OrderedDict(name -> (size, mtime)), oldest first
+        self.sizes = {}  # cache_key -> total bytes
+        self.pending = set()  # names written by the downloader but not yet sized
+        self.pinned = set()  # seeded tile names, kept outside the LRU
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.scan()
+
+    def seeded(self):
+        # Tile names listed in the seed manifests (<cache_key>.manifest.json)
+        names = set()
+        if not os.path.isdir(self.cache_dir):
+            return names
+        for manifest in os.listdir(self.cache_dir):
+            if not manifest.endswith(".manifest.json"):
+                continue
+            try:
+                with open(os.path.join(self.cache_dir, manifest)) as f:
+                    tiles = json.load(f).get("tiles", [])
+            except (OSError, ValueError) as error:
+                print(f"Could not read seed manifest {manifest}: {error}")
+                continue
+            names.update(tile["file"] for tile in tiles if tile.get("status") != "failed")
+        return names
+
+    def scan(self):
+        seeded = self.seeded()
+        entries = []
+        pinned = set()
+        if os.path.isdir(self.cache_dir):
+            with os.scandir(self.cache_dir) as it:
+                for entry in it:
+                    parsed = parse_tile_filename(entry.name)
+                    if parsed is None or not entry.is_file():
+                        continue
+                    if entry.name in seeded:
+                        pinned.add(entry.name)
+                        continue
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, entry.name, parsed[0], stat.st_size))
+
+        with self.lock:
+            self.pinned = pinned
+            self.providers = {}
+            self.sizes = {}
+            for mtime, name, cache_key, size in sorted(entries):
+                self.providers.setdefault(cache_key, OrderedDict())[name] = (size, mtime)
+                self.sizes[cache_key] = self.sizes.get(cache_key, 0) + size
+
+    def lookup(self, cache_key, name):
+        with self.lock:
+            if name in self.pinned:
+                self.hits += 1
+                return True
+            tiles = self.providers.get(cache_key)
+            if tiles is not None and name in tiles:
+                tiles.move_to_end(name)
+                self.hits += 1
+                return True
+            self.misses += 1
+            return False
+
+    def add(self, cache_key, name, size, mtime=None):
+        with self.lock:
+            tiles = self.providers.setdefault(cache_key, OrderedDict())
+            if name in tiles:
+                self.sizes[cache_key] -= tiles[name][0]
+            tiles[name] = (size, mtime or time.time())
+            self.sizes[cache_key] = self.sizes.get(cache_key, 0) + size
+
+    def mark_pending(self, name):
+        with self.lock:
+            self.pending.add(name)
+
+    def quota(self, cache_key):
+        return self.quotas.get(cache_key, self.default_quota)
+
+    def enforce(self):
+        # Pick up tiles the downloader finished since the last pass
+        with self.lock:
+            pending, self.pending = self.pending, set()
+        for name in pending:
+            try:
+                stat = os.stat(os.path.join(self.cache_dir, name))
+            except OSError:
+                continue
+            self.add(parse_tile_filename(name)[0], name, stat.st_size, stat.st_mtime)
+
+        evicted = []
+        now = time.time()
+        with self.lock:
+            for cache_key, tiles in self.providers.items():
+                # Recently used tiles sit at the end of the LRU order, so age is checked on every tile
+                if self.max_age is not None:
+                    expired = [name for name, (size, mtime) in tiles.items() if now - mtime > self.max_age]
+                    for name in expired:
+                        self.sizes[cache_key] -= tiles.pop(name)[0]
+                    evicted.extend(expired)
+
+                quota = self.quota(cache_key)
+                while tiles and self.sizes[cache_key] > quota:
+                    name, (size, mtime) = tiles.popitem(last=False)
+                    self.sizes[cache_key] -= size
+                    evicted.append(name)
+
+        for name in evicted:
+            try:
+                os.remove(os.path.join(self.cache_dir, name))
+            except OSError:
+                pass
+        return evicted
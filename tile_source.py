@@ -0,0 +1,26 @@
+import os
+
+from kivy_garden.mapview import MapSource
+
+import perf
+
+
+class CachedMapSource(MapSource):
+    # MapSource that answers cache hits from a TileCacheIndex instead of
+    # letting the downloader stat the cache directory for every tile.
+    def __init__(self, index, **kwargs):
+        super().__init__(**kwargs)
+        self.index = index
+
+    def fill_tile(self, tile):
+        if tile.state == "done":
+            return
+        name = os.path.basename(tile.cache_fn)
+        if self.index.lookup(self.cache_key, name):
+            perf.count("tiles.hit")
+            tile.set_source(tile.cache_fn)
+            return
+        perf.count("tiles.miss")
+        # The downloader writes the file; the index sizes it on its next pass
+        self.index.mark_pending(name)
+        super().fill_tile(tile)
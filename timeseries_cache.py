@@ -0,0 +1,193 @@
+import sqlite3
+import threading
+import time
+from datetime import date
+
+import numpy as np
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS series (
+    id INTEGER PRIMARY KEY,
+    url TEXT NOT NULL,
+    site TEXT NOT NULL,
+    variable TEXT NOT NULL,
+    n_points INTEGER NOT NULL DEFAULT 0,
+    last_access REAL NOT NULL,
+    utc_offset INTEGER,
+    UNIQUE (url, site, variable)
+);
+CREATE TABLE IF NOT EXISTS coverage (
+    series_id INTEGER NOT NULL,
+    start_day INTEGER NOT NULL,
+    end_day INTEGER NOT NULL,
+    fetched_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS coverage_series ON coverage (series_id);
+CREATE TABLE IF NOT EXISTS points (
+    series_id INTEGER NOT NULL,
+    ts TEXT NOT NULL,
+    value REAL,
+    PRIMARY KEY (series_id, ts)
+) WITHOUT ROWID;
+"""
+
+
+def to_day(value):
+    return date.fromisoformat(value).toordinal()
+
+
+def from_day(day):
+    return date.fromordinal(day).isoformat()
+
+
+class TimeSeriesCache:
+    # On-disk cache of GetValues responses keyed by (url, site, variable).
+    # Each series remembers which day ranges it has been fetched for, so a
+    # request only downloads the days it does not have yet. Ranges that were
+    # still in progress when fetched (ending within `settle_days` of the fetch)
+    # expire after `ttl` seconds; older ranges are final and never expire.
+    # Requested days are the service's local days while points are stored in
+    # UTC, so each series keeps the service's UTC offset to convert a window.
+    def __init__(self, path="timeseries_cache.db", ttl=3600, settle_days=2, max_points=1_000_000):
+        self.ttl = ttl
+        self.settle_days = settle_days
+        self.max_points = max_points
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(SCHEMA)
+        columns = [row[1] for row in self.conn.execute("PRAGMA table_info(series)")]
+        if "utc_offset" not in columns:
+            self.conn.execute("ALTER TABLE series ADD COLUMN utc_offset INTEGER")
+
+    def _series_id(self, url, site, variable, create=False):
+        row = self.conn.execute(
+            "SELECT id FROM series WHERE url = ? AND site = ? AND variable = ?", (url, site, variable)
+        ).fetchone()
+        if row:
+            return row[0]
+        if not create:
+            return None
+        cursor = self.conn.execute(
+            "INSERT INTO series (url, site, variable, last_access) VALUES (?, ?, ?, ?)", (url, site, variable, time.time())
+        )
+        return cursor.lastrowid
+
+    def _is_fresh(self, end_day, fetched_at, now):
+        settled = end_day < date.fromtimestamp(fetched_at).toordinal() - self.settle_days
+        return settled or fetched_at + self.ttl > now
+
+    def missing_ranges(self, url, site, variable, start_date, end_date):
+        start, end = to_day(start_date), to_day(end_date)
+        with self.lock:
+            series_id = self._series_id(url, site, variable)
+            if series_id is None:
+                return [(start_date, end_date)]
+            rows = self.conn.execute(
+                "SELECT start_day, end_day, fetched_at FROM coverage WHERE series_id = ? AND end_day >= ? AND start_day <= ?"
+                " ORDER BY start_day",
+                (series_id, start, end),
+            ).fetchall()
+
+        now = time.time()
+        missing = []
+        cursor = start
+        for cov_start, cov_end, fetched_at in rows:
+            if not self._is_fresh(cov_end, fetched_at, now):
+                continue
+            if cov_start > cursor:
+                missing.append((from_day(cursor), from_day(min(cov_start - 1, end))))
+            cursor = max(cursor, cov_end + 1)
+            if cursor > end:
+                break
+        if cursor <= end:
+            missing.append((from_day(cursor), from_day(end)))
+        return missing
+
+    def read(self, url, site, variable, start_date, end_date):
+        with self.lock:
+            series_id = self._series_id(url, site, variable)
+            if series_id is None:
+                return np.empty(0, dtype="datetime64[s]"), np.empty(0, dtype=np.float64)
+            offset = self.conn.execute("SELECT utc_offset FROM series WHERE id = ?", (series_id,)).fetchone()[0]
+            # Local midnight at both ends of the window, in UTC like the stored timestamps
+            shift = np.timedelta64(offset or 0, "m")
+            lower = np.datetime_as_string(np.datetime64(start_date, "s") - shift, unit="s")
+            upper = np.datetime_as_string(np.datetime64(from_day(to_day(end_date) + 1), "s") - shift, unit="s")
+            rows = self.conn.execute(
+                "SELECT ts, value FROM points WHERE series_id = ? AND ts >= ? AND ts < ? ORDER BY ts",
+                (series_id, lower, upper),
+            ).fetchall()
+            self.conn.execute("UPDATE series SET last_access = ? WHERE id = ?", (time.time(), series_id))
+            self.conn.commit()
+
+        # Timestamps are stored as ISO strings, UTC; missing values come back as NULL
+        times = np.array([ts for ts, _ in rows], dtype="datetime64[s]")
+        values = np.array([value for _, value in rows], dtype=np.float64)
+        return times, values
+
+    def store(self, url, site, variable, start_date, end_date, times, values, utc_offset=None):
+        start, end = to_day(start_date), to_day(end_date)
+        now = time.time()
+        with self.lock:
+            series_id = self._series_id(url, site, variable, create=True)
+            if utc_offset is not None:
+                self.conn.execute("UPDATE series SET utc_offset = ? WHERE id = ?", (utc_offset, series_id))
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO points (series_id, ts, value) VALUES (?, ?, ?)",
+                zip(
+                    [series_id] * len(times),
+                    np.datetime_as_string(np.asarray(times, dtype="datetime64[s]"), unit="s").tolist(),
+                    np.asarray(values, dtype=np.float64).tolist(),
+                ),
+            )
+            # Newer coverage replaces anything it fully contains
+            self.conn.execute(
+                "DELETE FROM coverage WHERE series_id = ? AND start_day >= ? AND end_day <= ?", (series_id, start, end)
+            )
+            self.conn.execute(
+                "INSERT INTO coverage (series_id, start_day, end_day, fetched_at) VALUES (?, ?, ?, ?)",
+                (series_id, start, end, now),
+            )
+            self.conn.execute(
+                "UPDATE series SET last_access = ?, n_points = (SELECT COUNT(*) FROM points WHERE series_id = ?) WHERE id = ?",
+                (now, series_id, series_id),
+            )
+            self._evict(keep=series_id)
+            self.conn.commit()
+
+    def _evict(self, keep=None):
+        # Drop least recently used series until the cache fits in max_points
+        total = self.conn.execute("SELECT COALESCE(SUM(n_points), 0) FROM series").fetchone()[0]
+        if total <= self.max_points:
+            return
+        for series_id, n_points in self.conn.execute(
+            "SELECT id, n_points FROM series WHERE id != ? ORDER BY last_access", (keep,)
+        ).fetchall():
+            self.conn.execute("DELETE FROM points WHERE series_id = ?", (series_id,))
+            self.conn.execute("DELETE FROM coverage WHERE series_id = ?", (series_id,))
+            self.conn.execute("DELETE FROM series WHERE id = ?", (series_id,))
+            total -= n_points
+            if total <= self.max_points:
+                break
+
+    def close(self):
+        self.conn.close()
+
+
+def cached_get_values(cache, fetch, url, site_full_code, variable_full_code, start_date, end_date):
+    # Only the parts of the window that are missing or stale are requested.
+    # When the service is unreachable whatever is cached is returned instead.
+    # fetch returns (UTC times, values, minutes east of UTC of the dates).
+    for missing_start, missing_end in cache.missing_ranges(url, site_full_code, variable_full_code, start_date, end_date):
+        try:
+            times, values, utc_offset = fetch(url, site_full_code, variable_full_code, missing_start, missing_end)
+        except Exception as error:
+            times, values = cache.read(url, site_full_code, variable_full_code, start_date, end_date)
+            if len(times) == 0:
+                raise
+            print(f"Using cached values for {site_full_code}, request failed: {error}")
+            return times, values
+        cache.store(url, site_full_code, variable_full_code, missing_start, missing_end, times, values, utc_offset)
+
+    return cache.read(url, site_full_code, variable_full_code, start_date, end_date)
@@ -0,0 +1,66 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from kivy.clock import Clock
+
+from forecast_fetch import clock_dispatch
+
+
+class ViewportScheduler:
+    # Coalesces bursts of MapView pan/zoom events into one update. The update
+    # runs once the map has been quiet for `delay` seconds, or after
+    # `max_wait` seconds of continuous movement. `snapshot` reads the viewport
+    # on the main thread, `query` runs on a worker thread, and `apply` gets
+    # the result back on the main thread unless a newer update superseded it.
+    def __init__(self, snapshot, query, apply, delay=0.1, max_wait=0.4, dispatch=clock_dispatch):
+        self.snapshot = snapshot
+        self.query = query
+        self.apply = apply
+        self.delay = delay
+        self.max_wait = max_wait
+        self.dispatch = dispatch
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="viewport")
+        self.event = None
+        self.first_request = None
+        self.generation = 0
+
+    def request(self, *args):
+        now = time.perf_counter()
+        if self.first_request is None:
+            self.first_request = now
+        if self.event is not None:
+            self.event.cancel()
+        delay = 0 if now - self.first_request >= self.max_wait else self.delay
+        self.event = Clock.schedule_once(self._run, delay)
+
+    def request_now(self, *args):
+        # Skips the debounce, e.g. for the first viewport after startup
+        if self.event is not None:
+            self.event.cancel()
+        self.event = Clock.schedule_once(self._run, 0)
+
+    def _run(self, dt):
+        self.event = None
+        self.first_request = None
+        self.generation += 1
+        generation = self.generation
+        state = self.snapshot()
+
+        def work():
+            # A newer viewport was requested while this one was queued
+            if generation != self.generation:
+                return
+            result = self.query(state)
+            self.dispatch(lambda: self._deliver(generation, state, result))
+
+        self.executor.submit(work)
+
+    def _deliver(self, generation, state, result):
+        if generation == self.generation:
+            self.apply(state, result)
+
+    def shutdown(self, wait=True):
+        if self.event is not None:
+            self.event.cancel()
+        self.generation += 1
+        self.executor.shutdown(wait=wait)
@@ -0,0 +1,81 @@
+import numpy as np
+
+NO_DATA_VALUE = -9999.0  # WaterML's usual noDataValue
+
+
+def parse_offsets(offsets):
+    # "-05:00" / "+0530" / "-5" / "Z" -> minutes east of UTC; distinct offsets
+    # are few. Missing or empty offsets are UTC, unparseable ones become NaT.
+    minutes = {offset: _offset_minutes(offset) for offset in set(offsets)}
+    return np.array([minutes[offset] for offset in offsets], dtype="timedelta64[m]")
+
+
+def _offset_minutes(offset):
+    text = (offset or "").strip()
+    if text in ("", "Z", "z"):
+        return 0
+    sign = -1 if text.startswith("-") else 1
+    digits = text[1:] if text[0] in "+-" else text
+    digits = digits.replace(":", "", 1)
+    if not digits.isdigit() or len(digits) > 4:
+        return "NaT"
+    if len(digits) > 2:
+        return sign * (int(digits[:-2]) * 60 + int(digits[-2:]))
+    return sign * int(digits) * 60
+
+
+def utc_offset(values):
+    # Minutes east of UTC of the service's local time, from the first record
+    if not values:
+        return None
+    first = values[0]
+    if first.get("timeOffset"):
+        offset = parse_offsets([first["timeOffset"]])[0]
+        if not np.isnat(offset):
+            return int(offset.astype(np.int64))
+    if first.get("dateTime") and first.get("dateTimeUTC"):
+        local, utc = np.datetime64(first["dateTime"], "s"), np.datetime64(first["dateTimeUTC"], "s")
+        return int((local - utc).astype(np.int64) // 60)
+    return None
+
+
+def parse_values(values, no_data_value=NO_DATA_VALUE):
+    # GetValues()["values"] records -> (datetime64[s] UTC timestamps, float64
+    # values). Timestamps come from dateTimeUTC when the service sends it, or
+    # from the local dateTime shifted by its timeOffset. No-data sentinels and
+    # unparseable values become NaN.
+    if not values:
+        return np.empty(0, dtype="datetime64[s]"), np.empty(0, dtype=np.float64)
+
+    first = values[0]
+    if first.get("dateTimeUTC"):
+        times = np.array([d["dateTimeUTC"] for d in values], dtype="datetime64[s]")
+    else:
+        times = np.array([d["dateTime"] for d in values], dtype="datetime64[s]")
+        if "timeOffset" in first:
+            times = times - parse_offsets([d.get("timeOffset") for d in values])
+            # A record whose offset cannot be read keeps its dateTimeUTC, if any, or NaT
+            unknown = np.flatnonzero(np.isnat(times))
+            if len(unknown):
+                times[unknown] = np.array([values[i].get("dateTimeUTC") or "NaT" for i in unknown],
+                                          dtype="datetime64[s]")
+
+    raw = [d.get("dataValue") for d in values]
+    try:
+        data = np.array(raw, dtype=np.float64)
+    except (TypeError, ValueError):
+        data = np.array([_to_float(value) for value in raw], dtype=np.float64)
+    data[data == float(no_data_value)] = np.nan
+
+    # Services do not always return records in time order
+    if len(times) > 1 and np.any(times[1:] < times[:-1]):
+        order = np.argsort(times, kind="stable")
+        times, data = times[order], data[order]
+    return times, data
+
+
+def _to_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan